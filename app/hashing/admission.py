@@ -0,0 +1,136 @@
+"""
+Admission control for the hashing endpoints.
+
+Every hash request holds a download and (eventually) a hashing job, both of
+which cost memory and temp disk. Rather than accepting work until the node
+falls over, requests take a slot from a bounded pool, wait in a bounded
+queue when it is full, and are turned away with a 429 once the queue is
+full too. Turning requests away quickly lets clients (and load balancers)
+back off to a less busy node.
+"""
+
+import asyncio
+import collections
+import contextlib
+import typing as t
+
+from fastapi import HTTPException
+
+from ..settings import settings
+
+_controller: t.Optional["AdmissionController"] = None
+
+
+class AdmissionController:
+    """
+    A FIFO, weighted semaphore with a bounded wait queue.
+
+    A request may cost more than one slot (a batch hashes several items at
+    once), but never more than max_in_flight, so it can always be admitted
+    eventually.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        *,
+        max_queued: int,
+        queue_timeout: float,
+        retry_after: int,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+        self._waiters: collections.deque[tuple[int, asyncio.Future[None]]] = (
+            collections.deque()
+        )
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def saturated(self) -> bool:
+        return self.queued >= self.max_queued
+
+    def stats(self) -> dict[str, t.Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "rejected": self.rejected,
+            "saturated": self.saturated,
+        }
+
+    @contextlib.asynccontextmanager
+    async def admit(self, cost: int = 1) -> t.AsyncIterator[None]:
+        """Hold cost slots for the duration of the block, or raise a 429"""
+        cost = max(1, min(cost, self.max_in_flight))
+        await self._acquire(cost)
+        try:
+            yield
+        finally:
+            self._release(cost)
+
+    async def _acquire(self, cost: int) -> None:
+        # Don't jump the queue, even if there is room for this one
+        if not self._waiters and self.in_flight + cost <= self.max_in_flight:
+            self.in_flight += cost
+            return
+        if self.saturated:
+            self._reject()
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (cost, waiter)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted at the same moment we gave up, hand it back
+                self._release(cost)
+            else:
+                waiter.cancel()
+                self._waiters.remove(entry)
+                # We may have been what blocked the head of the queue
+                self._wake()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject()
+
+    def _release(self, cost: int) -> None:
+        self.in_flight -= cost
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            cost, waiter = self._waiters[0]
+            if self.in_flight + cost > self.max_in_flight:
+                break
+            self._waiters.popleft()
+            self.in_flight += cost
+            waiter.set_result(None)
+
+    def _reject(self) -> t.NoReturn:
+        self.rejected += 1
+        raise HTTPException(
+            status_code=429,
+            detail="Too many hashing requests in progress, try again later",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            settings.hashing_max_in_flight,
+            max_queued=settings.hashing_max_queued,
+            queue_timeout=settings.hashing_queue_timeout,
+            retry_after=settings.hashing_retry_after,
+        )
+    return _controller
@@ -0,0 +1,274 @@
+"""
+A cache of hash results, so re-submitted content isn't hashed again.
+
+Results are keyed by a digest of the content bytes. For remote files, the
+validators the server gave us (ETag / Last-Modified) are also remembered
+per URL, so that a repeat fetch can be a conditional request, and a 304
+Not Modified (or an unchanged validator) needs no body transfer.
+
+Two backends are available:
+  * memory - a per-process LRU dict, for a single worker
+  * sqlite - a file on local disk, shared by every worker on the host
+"""
+
+import abc
+import collections
+from dataclasses import asdict, dataclass
+import json
+import sqlite3
+import threading
+import time
+import typing as t
+
+import anyio
+
+from ..settings import settings
+
+_cache: t.Optional["HashResultCache"] = None
+
+
+def content_key(digest: str) -> str:
+    return f"sha256:{digest}"
+
+
+def fetch_key(url: str) -> str:
+    return f"fetch:{url}"
+
+
+@dataclass
+class CachedFetch:
+    """What we remember about the last fetch of a URL"""
+
+    etag: t.Optional[str]
+    last_modified: t.Optional[str]
+    # The name of the ContentType the content was sniffed as
+    content_type: str
+    hashes: dict[str, str]
+
+    @classmethod
+    def from_response(
+        cls, headers: t.Mapping[str, str], content_type: str, hashes: dict[str, str]
+    ) -> t.Optional[t.Self]:
+        etag = headers.get("etag")
+        # Weak etags only promise semantic equivalence, not the same bytes
+        if etag is not None and etag.startswith("W/"):
+            etag = None
+        last_modified = headers.get("last-modified")
+        if etag is None and last_modified is None:
+            return None
+        return cls(etag, last_modified, content_type, hashes)
+
+    def is_unchanged(self, headers: t.Mapping[str, str]) -> bool:
+        """
+        Whether a full response has the validators we stored.
+
+        Some servers ignore conditional requests, but still send the same
+        validators, which means we can skip reading the body.
+        """
+        if self.etag is not None:
+            return headers.get("etag") == self.etag
+        return headers.get("last-modified") == self.last_modified
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag is not None:
+            headers["if-none-match"] = self.etag
+        if self.last_modified is not None:
+            headers["if-modified-since"] = self.last_modified
+        return headers
+
+    def covers(self, signal_names: t.Iterable[str]) -> bool:
+        return all(name in self.hashes for name in signal_names)
+
+
+class HashCacheBackend(metaclass=abc.ABCMeta):
+    """Storage for JSON-able cache entries, keyed by string"""
+
+    # Whether calls may block (and so should be kept off the event loop)
+    blocking: t.ClassVar[bool] = False
+
+    @abc.abstractmethod
+    def get(self, key: str) -> t.Optional[dict[str, t.Any]]:
+        """Return the cached value for the key, if present and not expired"""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: dict[str, t.Any]) -> None:
+        """Store a value for the key, evicting old entries if needed"""
+
+
+class MemoryHashCacheBackend(HashCacheBackend):
+    """An LRU dict with expiry, local to this process"""
+
+    def __init__(self, max_entries: int, ttl: int) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: collections.OrderedDict[str, tuple[float, dict[str, t.Any]]] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> t.Optional[dict[str, t.Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict[str, t.Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SqliteHashCacheBackend(HashCacheBackend):
+    """
+    An LRU cache with expiry in a local sqlite database.
+
+    Every worker on the host can open the same file, so a result hashed by
+    one worker is a hit for all of them.
+    """
+
+    blocking = True
+
+    # Trimming needs a count(*), so only do it every so often
+    TRIM_EVERY_N_SETS = 100
+    # Bumping accessed_at takes the write lock, so a hit only does it once
+    # the last bump is this fraction of the ttl old. The LRU order is only
+    # that precise, which is plenty for choosing what to evict.
+    TOUCH_AFTER_TTL_FRACTION = 0.1
+
+    def __init__(self, path: str, max_entries: int, ttl: int) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._sets_since_trim = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hash_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL"
+                ")"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS hash_cache_accessed_at"
+                " ON hash_cache (accessed_at)"
+            )
+
+    def get(self, key: str) -> t.Optional[dict[str, t.Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, accessed_at FROM hash_cache"
+                " WHERE key = ? AND expires_at >= ?",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            value, accessed_at = row
+            if now - accessed_at >= self.ttl * self.TOUCH_AFTER_TTL_FRACTION:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE hash_cache SET accessed_at = ? WHERE key = ?",
+                        (now, key),
+                    )
+        return json.loads(value)
+
+    def set(self, key: str, value: dict[str, t.Any]) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hash_cache"
+                " (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl, now),
+            )
+            self._sets_since_trim += 1
+            if self._sets_since_trim >= self.TRIM_EVERY_N_SETS:
+                self._sets_since_trim = 0
+                self._trim(now)
+
+    def _trim(self, now: float) -> None:
+        self._conn.execute("DELETE FROM hash_cache WHERE expires_at < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM hash_cache WHERE key IN ("
+            " SELECT key FROM hash_cache ORDER BY accessed_at"
+            " LIMIT max((SELECT count(*) FROM hash_cache) - ?, 0)"
+            ")",
+            (self.max_entries,),
+        )
+
+
+class HashResultCache:
+    """
+    Async front for a HashCacheBackend.
+
+    A hit only counts if every requested signal type is in the cached results,
+    which can happen if signal types were enabled since it was stored.
+    """
+
+    def __init__(self, backend: HashCacheBackend) -> None:
+        self.backend = backend
+
+    async def get(
+        self, key: str, signal_names: t.Iterable[str]
+    ) -> t.Optional[dict[str, str]]:
+        cached = await self._get(key)
+        if cached is None:
+            return None
+        try:
+            return {name: cached[name] for name in signal_names}
+        except KeyError:
+            return None
+
+    async def set(self, key: str, hashes: dict[str, str]) -> None:
+        await self._set(key, hashes)
+
+    async def get_fetch(self, url: str) -> t.Optional[CachedFetch]:
+        cached = await self._get(fetch_key(url))
+        return None if cached is None else CachedFetch(**cached)
+
+    async def set_fetch(self, url: str, fetch: CachedFetch) -> None:
+        await self._set(fetch_key(url), asdict(fetch))
+
+    async def _get(self, key: str) -> t.Optional[dict[str, t.Any]]:
+        if self.backend.blocking:
+            return await anyio.to_thread.run_sync(self.backend.get, key)
+        return self.backend.get(key)
+
+    async def _set(self, key: str, value: dict[str, t.Any]) -> None:
+        if self.backend.blocking:
+            await anyio.to_thread.run_sync(self.backend.set, key, value)
+        else:
+            self.backend.set(key, value)
+
+
+def get_hash_cache() -> t.Optional[HashResultCache]:
+    """Return the process-wide hash result cache, or None if disabled"""
+    global _cache
+    if _cache is None:
+        backend: HashCacheBackend
+        if settings.hash_cache_backend == "memory":
+            backend = MemoryHashCacheBackend(
+                settings.hash_cache_max_entries, settings.hash_cache_ttl
+            )
+        elif settings.hash_cache_backend == "sqlite":
+            backend = SqliteHashCacheBackend(
+                settings.hash_cache_path,
+                settings.hash_cache_max_entries,
+                settings.hash_cache_ttl,
+            )
+        else:
+            return None
+        _cache = HashResultCache(backend)
+    return _cache
@@ -0,0 +1,92 @@
+"""
+Detect the format of content from its first few bytes.
+
+Content-Type headers (and upload filenames) are often missing or wrong,
+and trusting them means downloading a mislabeled archive in full before
+hashing fails. Instead, we look at the magic bytes at the start of the
+first chunk, and decide from that whether it's worth reading the rest.
+"""
+
+from dataclasses import dataclass
+import typing as t
+
+from threatexchange.content_type.content_base import ContentType
+from threatexchange.content_type.photo import PhotoContent
+from threatexchange.content_type.video import VideoContent
+
+# Enough to identify every format below, MPEG-TS needs a second sync byte
+SNIFF_LENGTH = 189
+
+# ISO base media brands that are still images rather than video. PIL can't
+# decode these without plugins, so PDQ can't hash them either.
+_IMAGE_FTYP_BRANDS = {
+    b"heic",
+    b"heix",
+    b"heim",
+    b"heis",
+    b"mif1",
+    b"msf1",
+    b"avif",
+    b"avis",
+}
+
+
+@dataclass(frozen=True)
+class SniffedFormat:
+    name: str
+    content_type: t.Type[ContentType]
+
+
+JPEG = SniffedFormat("jpeg", PhotoContent)
+PNG = SniffedFormat("png", PhotoContent)
+GIF = SniffedFormat("gif", PhotoContent)
+WEBP = SniffedFormat("webp", PhotoContent)
+BMP = SniffedFormat("bmp", PhotoContent)
+TIFF = SniffedFormat("tiff", PhotoContent)
+
+MP4 = SniffedFormat("mp4", VideoContent)
+MATROSKA = SniffedFormat("matroska", VideoContent)
+AVI = SniffedFormat("avi", VideoContent)
+FLV = SniffedFormat("flv", VideoContent)
+MPEG_PS = SniffedFormat("mpeg-ps", VideoContent)
+MPEG_TS = SniffedFormat("mpeg-ts", VideoContent)
+ASF = SniffedFormat("asf", VideoContent)
+
+
+def sniff_format(head: bytes) -> t.Optional[SniffedFormat]:
+    """
+    Identify the format of content from its first bytes.
+
+    Returns None if the format is unknown or not one we can hash.
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return JPEG
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return PNG
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return GIF
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return WEBP
+    if head.startswith(b"RIFF") and head[8:12] == b"AVI ":
+        return AVI
+    if head.startswith(b"BM") and len(head) >= 14:
+        return BMP
+    if head.startswith((b"II*\x00", b"MM\x00*")):
+        return TIFF
+
+    if head[4:8] == b"ftyp":
+        if head[8:12] in _IMAGE_FTYP_BRANDS:
+            return None
+        return MP4
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return MATROSKA
+    if head.startswith(b"FLV\x01"):
+        return FLV
+    if head.startswith((b"\x00\x00\x01\xba", b"\x00\x00\x01\xb3")):
+        return MPEG_PS
+    if head.startswith(b"\x30\x26\xb2\x75\x8e\x66\xcf\x11"):
+        return ASF
+    if len(head) > 188 and head[0] == 0x47 and head[188] == 0x47:
+        return MPEG_TS
+
+    return None
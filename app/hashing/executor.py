@@ -0,0 +1,151 @@
+"""
+A process pool for running CPU-bound hashers.
+
+Hashers like PDQ are pure python/C that hold the GIL for the whole hash,
+so running them in the threadpool caps a worker at roughly one core. This
+pushes them out to a pool of processes instead.
+
+To avoid pickling large buffers across the process boundary, work is
+handed over either as a path to a file that is already on disk, or as the
+name of a shared memory segment that holds the bytes, which the worker
+hashes in place.
+"""
+
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+import typing as t
+from multiprocessing import shared_memory
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+from threatexchange.signal_type.signal_base import BytesHasher, FileHasher
+
+from ..settings import settings
+
+_executor: t.Optional["HashingExecutor"] = None
+
+
+class HashingExecutor:
+    """
+    Dispatches hashing work to a pool of worker processes.
+
+    At most max_workers + max_queue_depth jobs are submitted to the pool at
+    any one time, further callers wait for a slot to free up.
+
+    A pool size of 0 disables the process pool and hashes in the threadpool
+    instead, which is mostly useful for development.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        *,
+        max_tasks_per_child: t.Optional[int] = None,
+        max_queue_depth: int = 0,
+    ) -> None:
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self._pool: t.Optional[concurrent.futures.ProcessPoolExecutor] = None
+        if max_workers > 0:
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                # Forking a process with running threads (uvicorn, the db
+                # pool) is asking for trouble, so always start fresh.
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=max_tasks_per_child,
+            )
+        self._slots = asyncio.Semaphore(max(max_workers, 1) + max_queue_depth)
+
+    async def hash_file(
+        self, signal_types: t.Iterable[t.Type[FileHasher]], path: Path
+    ) -> dict[str, str]:
+        """Hash a file on disk with each of the signal types"""
+        return await self._run(_hash_file, list(signal_types), path)
+
+    async def hash_bytes(
+        self, signal_types: t.Iterable[t.Type[BytesHasher]], data: bytes | bytearray
+    ) -> dict[str, str]:
+        """Hash an in-memory buffer with each of the signal types"""
+        signal_types = list(signal_types)
+        if self._pool is None:
+            return await self._run(_hash_bytes, signal_types, bytes(data))
+
+        shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        try:
+            shm.buf[: len(data)] = data
+            return await self._run(
+                _hash_shared_memory, signal_types, shm.name, len(data)
+            )
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(
+        self, fn: t.Callable[..., dict[str, str]], *args: t.Any
+    ) -> dict[str, str]:
+        async with self._slots:
+            if self._pool is None:
+                return await run_in_threadpool(fn, *args)
+            return await asyncio.wrap_future(self._pool.submit(fn, *args))
+
+
+def get_hashing_executor() -> HashingExecutor:
+    """Return the process-wide hashing executor"""
+    global _executor
+    if _executor is None:
+        _executor = HashingExecutor(
+            (
+                settings.hashing_pool_size
+                if settings.hashing_pool_size is not None
+                else _default_pool_size()
+            ),
+            max_tasks_per_child=settings.hashing_pool_max_tasks_per_child,
+            max_queue_depth=settings.hashing_pool_max_queue_depth,
+        )
+    return _executor
+
+
+def _default_pool_size() -> int:
+    # Every worker on the host has a pool, so they share the cores
+    workers = int(os.environ.get("WEB_CONCURRENCY") or 1)
+    return max((os.cpu_count() or 1) // max(workers, 1), 1)
+
+
+def shutdown_hashing_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+# The functions below run inside the worker processes
+
+
+def _hash_file(signal_types: list[t.Type[FileHasher]], path: Path) -> dict[str, str]:
+    return {st.get_name(): st.hash_from_file(path) for st in signal_types}
+
+
+def _hash_bytes(signal_types: list[t.Type[BytesHasher]], data: bytes) -> dict[str, str]:
+    return {st.get_name(): st.hash_from_bytes(data) for st in signal_types}
+
+
+def _hash_shared_memory(
+    signal_types: list[t.Type[BytesHasher]], name: str, size: int
+) -> dict[str, str]:
+    # Spawned workers share the parent's resource tracker, so attaching here
+    # doesn't change who is responsible for unlinking the segment.
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # Hashed in place rather than copied out. The hashers we have only
+        # need a buffer (hashlib, or PIL reading through io.BytesIO), and
+        # none keep a reference to it, which close() would refuse.
+        with shm.buf[:size] as view:
+            return _hash_bytes(signal_types, t.cast(bytes, view))
+    finally:
+        shm.close()
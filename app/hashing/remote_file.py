@@ -1,9 +1,18 @@
 # Add these constants at the top level
+import asyncio
+import contextlib
+import typing as t
 from urllib.parse import urlparse
 
-from fastapi import logger
+import httpx
+from fastapi import HTTPException, logger
 from ..settings import settings
 
+_http_client: httpx.AsyncClient | None = None
+# The semaphore per host, and how many fetches are holding or waiting on it
+_host_semaphores: dict[str, tuple[asyncio.Semaphore, int]] = {}
+
+
 def is_valid_url(url: str) -> bool:
     """
     Validate URL to prevent SSRF attacks.
@@ -38,3 +47,114 @@ def is_valid_url(url: str) -> bool:
     except Exception as e:
         logger.logger.warning(f"URL validation error: {str(e)}")
         return False
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide HTTP client used for fetching remote media.
+
+    Sharing one client means connections (and TLS sessions) are pooled and
+    kept alive between requests, instead of paying for a new handshake on
+    every download.
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(settings.fetch_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.fetch_max_connections,
+                max_keepalive_connections=settings.fetch_max_keepalive_connections,
+                keepalive_expiry=settings.fetch_keepalive_expiry,
+            ),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+@contextlib.asynccontextmanager
+async def _host_slot(url: str) -> t.AsyncIterator[None]:
+    # httpx only limits connections across the whole pool, so one slow origin
+    # could otherwise take every connection we have. A host's semaphore is
+    # dropped once no fetch is using it, so the map doesn't grow with every
+    # host we're ever sent to.
+    host = urlparse(url).netloc.lower()
+    semaphore, users = _host_semaphores.get(host, (None, 0))
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.fetch_max_connections_per_host)
+    _host_semaphores[host] = (semaphore, users + 1)
+    try:
+        async with semaphore:
+            yield
+    finally:
+        semaphore, users = _host_semaphores[host]
+        if users == 1:
+            del _host_semaphores[host]
+        else:
+            _host_semaphores[host] = (semaphore, users - 1)
+
+
+@contextlib.asynccontextmanager
+async def fetch(
+    url: str, headers: t.Optional[t.Mapping[str, str]] = None
+) -> t.AsyncIterator[httpx.Response]:
+    """
+    Open a streaming GET request for a remote file.
+
+    The body has not been read when the response is yielded, use
+    iter_limited() to consume it. If conditional headers are passed, the
+    response may be a 304 Not Modified, which has no body.
+    """
+    async with _host_slot(url):
+        try:
+            async with get_http_client().stream(
+                "GET", url, headers=headers
+            ) as response:
+                if response.status_code == httpx.codes.NOT_MODIFIED and headers:
+                    yield response
+                    return
+                response.raise_for_status()
+
+                content_length = response.headers.get("content-length")
+                if (
+                    content_length is not None
+                    and int(content_length) > settings.max_content_length
+                ):
+                    raise HTTPException(
+                        status_code=413, detail="Requested file is too large"
+                    )
+
+                yield response
+        except httpx.HTTPStatusError as e:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Remote server responded with {e.response.status_code}",
+            )
+        except httpx.HTTPError as e:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Failed to fetch remote file: {e.__class__.__name__}",
+            )
+
+
+async def iter_limited(response: httpx.Response) -> t.AsyncIterator[bytes]:
+    """
+    Stream the response body, aborting once it exceeds max_content_length.
+
+    The content-length header is checked up front, but it may be missing or
+    lie, so we also count the bytes as they arrive.
+    """
+    total_bytes = 0
+    async for chunk in response.aiter_bytes(settings.fetch_chunk_size):
+        if not chunk:
+            continue
+        total_bytes += len(chunk)
+        if total_bytes > settings.max_content_length:
+            raise HTTPException(status_code=413, detail="Requested file is too large")
+        yield chunk
@@ -0,0 +1,121 @@
+"""
+Single pass hashing of content as it streams in.
+
+Some hashers (like MD5) can consume content a chunk at a time, and don't
+need the content to be buffered at all. The rest need the whole object,
+which is held in memory up to a configurable size, and only spilled to a
+temporary file past that.
+"""
+
+import hashlib
+import tempfile
+import typing as t
+from pathlib import Path
+
+import anyio
+from threatexchange.signal_type.md5 import VideoMD5Signal
+from threatexchange.signal_type.signal_base import BytesHasher, FileHasher
+
+from .executor import HashingExecutor
+
+# SignalTypes whose hash is just a digest of the raw bytes, so can be
+# computed incrementally. The output must match hash_from_bytes() exactly.
+INCREMENTAL_HASHERS: t.Mapping[t.Type[FileHasher], t.Callable[[], t.Any]] = {
+    VideoMD5Signal: hashlib.md5,
+}
+
+
+class StreamingHasher:
+    """
+    Hashes content with several SignalTypes in a single pass.
+
+    Usage:
+
+      with StreamingHasher(signal_types, max_memory_size=...) as hasher:
+          async for chunk in stream:
+              await hasher.update(chunk)
+          hashes = await hasher.finish(executor)
+    """
+
+    def __init__(
+        self,
+        signal_types: t.Iterable[t.Type[FileHasher]],
+        *,
+        max_memory_size: int,
+        content_digest: bool = False,
+    ) -> None:
+        self._signal_types = list(signal_types)
+        self._incremental = {
+            st.get_name(): INCREMENTAL_HASHERS[st]()
+            for st in self._signal_types
+            if st in INCREMENTAL_HASHERS
+        }
+        self._whole = [st for st in self._signal_types if st not in INCREMENTAL_HASHERS]
+
+        # A FileHasher that can't hash bytes needs a file, no matter the size
+        self._max_memory_size = max_memory_size
+        if not all(issubclass(st, BytesHasher) for st in self._whole):
+            self._max_memory_size = 0
+
+        self._buffer = bytearray()
+        self._file: t.Optional[t.IO[bytes]] = None
+        self._digest = hashlib.sha256() if content_digest else None
+
+    def __enter__(self) -> t.Self:
+        return self
+
+    def __exit__(self, *args: t.Any) -> None:
+        self.close()
+
+    @property
+    def content_digest(self) -> str:
+        """A sha256 of the content read so far, if requested"""
+        assert self._digest is not None, "content_digest was not requested"
+        return self._digest.hexdigest()
+
+    async def update(self, chunk: bytes) -> None:
+        if self._digest is not None:
+            self._digest.update(chunk)
+        for hasher in self._incremental.values():
+            hasher.update(chunk)
+
+        if not self._whole:
+            return
+
+        if (
+            self._file is None
+            and len(self._buffer) + len(chunk) > self._max_memory_size
+        ):
+            self._file = tempfile.NamedTemporaryFile("wb")
+            await anyio.to_thread.run_sync(self._file.write, self._buffer)
+            self._buffer = bytearray()
+
+        if self._file is not None:
+            await anyio.to_thread.run_sync(self._file.write, chunk)
+        else:
+            self._buffer += chunk
+
+    async def finish(self, executor: HashingExecutor) -> dict[str, str]:
+        """Complete the hashes, once the content has been fully read"""
+        hashes = {
+            name: hasher.hexdigest() for name, hasher in self._incremental.items()
+        }
+
+        if self._file is not None:
+            await anyio.to_thread.run_sync(self._file.flush)
+            hashes.update(await executor.hash_file(self._whole, Path(self._file.name)))
+        elif self._whole:
+            hashes.update(
+                await executor.hash_bytes(
+                    t.cast(list[t.Type[BytesHasher]], self._whole), self._buffer
+                )
+            )
+
+        # Keep the order the signal types were given in
+        return {st.get_name(): hashes[st.get_name()] for st in self._signal_types}
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = bytearray()
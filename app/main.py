@@ -2,7 +2,11 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Response, status
 from fastapi.responses import RedirectResponse
 
+from .storage.database import schema
 from .storage.database.connection import engine
+from .hashing import remote_file
+from .hashing.executor import shutdown_hashing_executor
+from .matching.index_cache import get_index_cache
 
 from .settings import settings
 from .routers import hashing, matching
@@ -11,7 +15,15 @@ from .ui import app as ui
 @asynccontextmanager
 async def lifespan(app: FastAPI):
   print(f"App Started {app.title}")
+  if settings.database_migrate:
+    schema.migrate()
+  if settings.role_matcher:
+    # Loads every index in the background, /status is 503 until it's done
+    get_index_cache().start()
   yield
+  await get_index_cache().stop()
+  await remote_file.close_http_client()
+  shutdown_hashing_executor()
   engine.dispose()
   print("App stopped")
 
@@ -46,10 +58,8 @@ def server_status(response: Response):
   """
   Liveness/readiness check endpoint for your favourite Layer 7 load balancer
   """
-  if settings.role_matcher:
-    # if matching.index_cache_is_stale():
+  if settings.role_matcher and get_index_cache().is_stale():
     response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
     return "INDEX-STALE"
 
-  # if app.config.get("ROLE_MATCHER", False):
   return "I-AM-ALIVE"
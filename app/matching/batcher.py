@@ -0,0 +1,76 @@
+"""
+Coalescing concurrent lookups into batches.
+
+Under load, the matcher gets many single hash lookups at once, and scoring
+each one on its own pays the per-query overhead (a thread hop, a scan of
+the index) every time. A MicroBatcher holds each lookup for at most a short
+window, and runs everything that arrived in it as one batch, which the PDQ
+index scores in a single pass. A batch is run as soon as it's full, so the
+window bounds the extra latency even at peak.
+"""
+
+import asyncio
+import typing as t
+
+from starlette.concurrency import run_in_threadpool
+
+K = t.TypeVar("K")
+R = t.TypeVar("R")
+
+
+class MicroBatcher(t.Generic[K, R]):
+    """
+    Collects submitted items into batches for fn, run in the threadpool.
+
+    fn must return one result per item, in order. If it raises, every
+    submitter of the batch gets the exception.
+    """
+
+    def __init__(
+        self,
+        fn: t.Callable[[list[K]], t.Sequence[R]],
+        *,
+        window: float,
+        max_size: int,
+    ) -> None:
+        self.fn = fn
+        self.window = window
+        self.max_size = max_size
+        self._pending: list[t.Tuple[K, asyncio.Future[R]]] = []
+        self._timer: t.Optional[asyncio.TimerHandle] = None
+        # The event loop only keeps weak references to tasks
+        self._running: set[asyncio.Task[None]] = set()
+
+    async def submit(self, item: K) -> R:
+        future: asyncio.Future[R] = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.window, self._flush
+            )
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: list[t.Tuple[K, asyncio.Future[R]]]) -> None:
+        try:
+            results = await run_in_threadpool(self.fn, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results, strict=True):
+            # The submitter may have gone away (say, the client disconnected)
+            if not future.done():
+                future.set_result(result)
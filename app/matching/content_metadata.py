@@ -0,0 +1,313 @@
+"""
+The matcher's columnar copy of bank content metadata, to post-filter hits.
+
+An index only returns content ids. Turning those into matches needs each
+one's bank, whether it's disabled, and whether it's sampled in by its bank's
+matching_enabled_ratio. Looking that up in the database for every query is
+far too slow for thousands of hits, so instead the matcher keeps:
+
+  * bank[content id] - a small int code for the content's bank
+  * disable_until_ts[content id]
+  * a table of bank name and enabled_ratio by bank code
+
+which filter and annotate every hit of a query in one vectorized step.
+
+New content is read by id since the last refresh, and removals and disables
+are replayed from the bank_content_change log, every few seconds. Content
+the matcher hasn't read yet (say, if the index was rebuilt since, or its
+transaction committed after content with a higher id had been read) is
+looked up in the database as a fallback.
+"""
+
+import collections
+from dataclasses import dataclass
+import logging
+import math
+import time
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+from threatexchange.signal_type.index import IndexMatchUntyped
+
+from app.storage import interface
+
+logger = logging.getLogger(__name__)
+
+T = t.TypeVar("T", bound=IndexMatchUntyped[t.Any, int])
+
+# Bank codes with special meanings
+UNKNOWN = 0
+REMOVED = -1
+
+
+@dataclass
+class _BankTable:
+    """Banks by code, code 0 (UNKNOWN) has no bank"""
+
+    names: list[str]
+    enabled_ratio: npt.NDArray[np.float64]
+
+
+@dataclass
+class _Columns:
+    """
+    Bank code and disable_until_ts by content id.
+
+    Only ever replaced as a whole, so a reader always sees arrays of the
+    same length.
+    """
+
+    bank: npt.NDArray[np.int32]
+    disable_until_ts: npt.NDArray[np.int64]
+
+
+class ContentMetadata:
+    """
+    Bank and disable_until_ts of every piece of content, by content id.
+
+    Changes are written into the arrays in place, and the arrays are only
+    replaced, all at once, to grow them or start again, so readers never
+    take a lock. A reader may see some of a refresh's changes but not
+    others, the same as if it had read a moment earlier or later.
+    """
+
+    PAGE_SIZE = 10_000
+    # Ids are taken before commit, so content can become visible behind
+    # what we've read. New content is read again for this long, to catch it.
+    CONTENT_REREAD_WINDOW = 10.0
+
+    def __init__(self, change_retention: float = math.inf) -> None:
+        # How long the store keeps changes. If we fall further behind than
+        # that, we may have missed some, so start again.
+        self.change_retention = change_retention
+        self.last_refresh_at: t.Optional[float] = None
+        self._banks = _BankTable([""], np.zeros(1, dtype=np.float64))
+        self._bank_codes: dict[int, int] = {}
+        self._reset()
+
+    def _reset(self) -> None:
+        self._columns = _Columns(
+            np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64)
+        )
+        self._count = 0
+        self._max_id = 0
+        # (time, _max_id) as of each refresh, within the reread window
+        self._max_id_history: collections.deque[t.Tuple[float, int]] = (
+            collections.deque()
+        )
+        # The last change applied, None until the first refresh
+        self._change_cursor: t.Optional[t.Tuple[int, int]] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def resolve(
+        self,
+        matches: t.Sequence[T],
+        storage: interface.IBankStore,
+        now: t.Optional[float] = None,
+    ) -> list[t.Tuple[T, str]]:
+        """
+        The matches that should be returned, with the name of their bank.
+
+        Drops matches for content that has been removed or is disabled, or
+        that isn't sampled in by its bank's matching_enabled_ratio.
+        """
+        if not matches:
+            return []
+        now = time.time() if now is None else now
+        ids = np.fromiter(
+            (m.metadata for m in matches), dtype=np.int64, count=len(matches)
+        )
+        # Read each attribute once, as they may be replaced under us
+        columns, banks = self._columns, self._banks
+
+        codes = np.full(len(ids), UNKNOWN, dtype=np.int32)
+        disabled = np.zeros(len(ids), dtype=np.int64)
+        in_range = ids < len(columns.bank)
+        codes[in_range] = columns.bank[ids[in_range]]
+        disabled[in_range] = columns.disable_until_ts[ids[in_range]]
+        # Content in a bank that's new since the bank table was built, which
+        # a refresh in progress may have added already
+        codes[codes >= len(banks.names)] = UNKNOWN
+
+        ok = (codes > 0) & _enabled(disabled, now)
+        ok[ok] = _sampled(ids[ok], banks.enabled_ratio[codes[ok]])
+        ret = {
+            i: (matches[i], banks.names[codes[i]]) for i in np.flatnonzero(ok).tolist()
+        }
+
+        unknown = np.flatnonzero(codes == UNKNOWN).tolist()
+        if unknown:
+            ret.update(self._resolve_from_storage(matches, unknown, storage, now))
+        return [ret[i] for i in sorted(ret)]
+
+    def refresh(self, storage: interface.IBankStore) -> None:
+        """Read content added and changes made since the last refresh"""
+        now = time.time()
+        if (
+            self.last_refresh_at is not None
+            and now - self.last_refresh_at > self.change_retention
+        ):
+            logger.warning(
+                "Content metadata last refreshed %ds ago, past the change log's "
+                "retention, reloading it",
+                now - self.last_refresh_at,
+            )
+            self._reset()
+        if self._change_cursor is None:
+            # Taken before reading content, so that any change the content
+            # we read doesn't reflect comes after it
+            self._change_cursor = storage.bank_content_get_changes_start()
+
+        history = self._max_id_history
+        while len(history) > 1 and history[1][0] <= now - self.CONTENT_REREAD_WINDOW:
+            history.popleft()
+        after_id = history[0][1] if history else 0
+        while True:
+            items = storage.bank_content_get_metadata(after_id, self.PAGE_SIZE)
+            if items:
+                self._add(items)
+                after_id = items[-1].bank_content_id
+            if len(items) < self.PAGE_SIZE:
+                break
+        history.append((now, self._max_id))
+
+        # Read after the content, so that every bank it's in is there
+        banks_by_id = storage.get_banks_by_id()
+        for bank_id in banks_by_id:
+            self._code_for_bank(bank_id)
+        names = [""] * (len(self._bank_codes) + 1)
+        # Banks we've seen that are gone have a ratio of 0, never matching
+        enabled_ratio = np.zeros(len(names), dtype=np.float64)
+        for bank_id, config in banks_by_id.items():
+            code = self._bank_codes[bank_id]
+            names[code] = config.name
+            enabled_ratio[code] = config.matching_enabled_ratio
+        self._banks = _BankTable(names, enabled_ratio)
+
+        # Content already read may be replayed over too, but as changes are
+        # applied in order of id, which is the order they were made to any
+        # one piece of content, the last change wins
+        cursor = self._change_cursor
+        changes: list[interface.BankContentChangeItem] = []
+        while True:
+            page = storage.bank_content_get_changes(cursor, self.PAGE_SIZE)
+            changes.extend(page)
+            if page:
+                cursor = page[-1].cursor
+            if len(page) < self.PAGE_SIZE:
+                break
+        for change in sorted(changes, key=lambda c: c.id):
+            self._apply(change)
+        self._change_cursor = cursor
+        self.last_refresh_at = time.time()
+
+    def _add(self, items: t.Sequence[interface.BankContentMetadataItem]) -> None:
+        ids = np.fromiter(
+            (i.bank_content_id for i in items), dtype=np.int64, count=len(items)
+        )
+        codes = np.fromiter(
+            (self._code_for_bank(i.bank_id) for i in items),
+            dtype=np.int32,
+            count=len(items),
+        )
+        disable_until_ts = np.fromiter(
+            (i.disable_until_ts for i in items), dtype=np.int64, count=len(items)
+        )
+        self._grow(int(ids.max()) + 1)
+        columns = self._columns
+        # Content is read again within the reread window, but once removed,
+        # stays removed
+        current = columns.bank[ids]
+        keep = current != REMOVED
+        ids, codes, disable_until_ts = ids[keep], codes[keep], disable_until_ts[keep]
+        # Fill disable_until_ts first, so a reader never sees a bank for
+        # content it doesn't have the state of yet
+        columns.disable_until_ts[ids] = disable_until_ts
+        columns.bank[ids] = codes
+        self._count += int(np.count_nonzero(current[keep] == UNKNOWN))
+        self._max_id = max(self._max_id, int(ids.max(initial=self._max_id)))
+
+    def _code_for_bank(self, bank_id: int) -> int:
+        return self._bank_codes.setdefault(bank_id, len(self._bank_codes) + 1)
+
+    def _apply(self, change: interface.BankContentChangeItem) -> None:
+        id = change.bank_content_id
+        columns = self._columns
+        # Content we haven't read yet will be read with its current state
+        if id >= len(columns.bank) or columns.bank[id] == UNKNOWN:
+            return
+        if change.removed:
+            if columns.bank[id] != REMOVED:
+                columns.bank[id] = REMOVED
+                self._count -= 1
+        else:
+            columns.disable_until_ts[id] = change.disable_until_ts
+
+    def _grow(self, size: int) -> None:
+        old = self._columns
+        if size <= len(old.bank):
+            return
+        # By at least half, so a run of new content doesn't copy each time
+        size = max(size, len(old.bank) * 3 // 2)
+        bank = np.zeros(size, dtype=np.int32)
+        bank[: len(old.bank)] = old.bank
+        disable_until_ts = np.zeros(size, dtype=np.int64)
+        disable_until_ts[: len(old.disable_until_ts)] = old.disable_until_ts
+        self._columns = _Columns(bank, disable_until_ts)
+
+    @staticmethod
+    def _resolve_from_storage(
+        matches: t.Sequence[T],
+        indices: list[int],
+        storage: interface.IBankStore,
+        now: float,
+    ) -> dict[int, t.Tuple[T, str]]:
+        by_id = {
+            c.id: c
+            for c in storage.bank_content_get(matches[i].metadata for i in indices)
+        }
+        ret = {}
+        for i in indices:
+            content = by_id.get(matches[i].metadata)
+            if content is None or content.bank is None:
+                continue
+            sampled = _sampled(
+                np.array([content.id], dtype=np.int64),
+                np.array([content.bank.matching_enabled_ratio]),
+            )
+            if _enabled(np.array([content.disable_until_ts]), now)[0] and sampled[0]:
+                ret[i] = (matches[i], content.bank.name)
+        return ret
+
+
+def _enabled(
+    disable_until_ts: npt.NDArray[np.int64], now: float
+) -> npt.NDArray[np.bool_]:
+    """Vectorized BankContentConfig.enabled"""
+    return (disable_until_ts == interface.BankContentConfig.ENABLED) | (
+        (disable_until_ts > interface.BankContentConfig.ENABLED)
+        & (disable_until_ts <= now)
+    )
+
+
+def _sampled(
+    ids: npt.NDArray[np.int64], enabled_ratio: npt.NDArray[np.float64]
+) -> npt.NDArray[np.bool_]:
+    """
+    Whether content is sampled in by its bank's matching_enabled_ratio.
+
+    Seeded by the content id, so the same content is always in or out for a
+    given ratio, and raising the ratio only ever adds content.
+    """
+    # The splitmix64 finalizer, to spread sequential ids uniformly
+    x = ids.astype(np.uint64)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    # The top 53 bits as a float in [0, 1)
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53) < enabled_ratio
@@ -0,0 +1,389 @@
+"""
+Building the SignalTypeIndex for each signal type from the banks.
+
+Builds are incremental where possible: only content added since the last
+build's checkpoint is read, and appended to the stored index. If content
+has been removed since, the index is rebuilt from scratch.
+
+Every node may run the builder, but only one builds a signal type at a
+time: the others skip it while it holds the store's build lock, and can
+follow its progress in the build status.
+
+Signal types are independent, so with more than one worker, each is built
+in a process of its own, as many at once as fit in the memory budget.
+
+Run from the command line to build every signal type's index:
+
+  python -m app.matching.index_builder [--full] [--workers N] [signal_type ...]
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import logging
+import multiprocessing
+import os
+import socket
+import time
+import typing as t
+
+from threatexchange.signal_type.index import SignalTypeIndex
+from threatexchange.signal_type.pdq.signal import PdqSignal
+from threatexchange.signal_type.signal_base import SignalType
+
+from app.storage import interface
+from app.storage.adapter import get_storage
+from app.storage.database import schema
+
+from app.settings import settings
+
+from .mih_index import MIHPdqIndex
+from .pdq_index import PackedPdqIndex
+
+logger = logging.getLogger(__name__)
+
+# A rough peak for building an index, per signal, to fit builds in memory.
+# Streaming holds each signal's string, and the MIH tables are ~100 bytes.
+ESTIMATED_BYTES_PER_SIGNAL = 512
+
+PDQ_INDEX_TYPES: t.Mapping[str, t.Type[SignalTypeIndex[int]]] = {
+    "packed": PackedPdqIndex,
+    "mih": MIHPdqIndex,
+}
+
+
+def get_index_cls(signal_type: t.Type[SignalType]) -> t.Type[SignalTypeIndex[int]]:
+    """The index to build for a signal type, which may not be its default"""
+    if signal_type is PdqSignal:
+        return PDQ_INDEX_TYPES[settings.pdq_index_type]
+    return signal_type.get_index_cls()
+
+
+class _CheckpointTracker:
+    """Follows the items fed into an index, to checkpoint exactly what it holds"""
+
+    # How often to report progress, in items
+    PROGRESS_INTERVAL = 100_000
+
+    def __init__(
+        self,
+        checkpoint: interface.SignalTypeIndexBuildCheckpoint,
+        on_progress: t.Callable[[int], None] = lambda _: None,
+    ) -> None:
+        self.checkpoint = checkpoint
+        self.added = 0
+        self.added_id_sum = 0
+        self.on_progress = on_progress
+        self._last: t.Optional[interface.BankContentIterationItem] = None
+
+    def entries(
+        self, items: t.Iterable[interface.BankContentIterationItem]
+    ) -> t.Iterator[t.Tuple[str, int]]:
+        for item in items:
+            self.added += 1
+            self.added_id_sum += item.bank_content_id
+            self._last = item
+            if self.added % self.PROGRESS_INTERVAL == 0:
+                self.on_progress(self.checkpoint.total_hash_count + self.added)
+            yield item.signal_val, item.bank_content_id
+        if self._last is not None:
+            self.checkpoint = interface.SignalTypeIndexBuildCheckpoint(
+                last_item_timestamp=self._last.bank_content_timestamp,
+                last_item_id=self._last.bank_content_id,
+                total_hash_count=self.checkpoint.total_hash_count + self.added,
+                content_id_sum=self._content_id_sum(),
+            )
+
+    def columns(
+        self,
+        batches: t.Iterable[interface.BankContentColumns],
+        upto: interface.SignalTypeIndexBuildCheckpoint,
+    ) -> t.Iterator[interface.BankContentColumns]:
+        """As entries(), for a bulk export of the content up to upto"""
+        for batch in batches:
+            before = self.added
+            self.added += len(batch)
+            self.added_id_sum += int(batch.bank_content_ids.sum())
+            if self.added // self.PROGRESS_INTERVAL > before // self.PROGRESS_INTERVAL:
+                self.on_progress(self.checkpoint.total_hash_count + self.added)
+            yield batch
+        if self.added:
+            self.checkpoint = interface.SignalTypeIndexBuildCheckpoint(
+                last_item_timestamp=upto.last_item_timestamp,
+                last_item_id=upto.last_item_id,
+                total_hash_count=self.checkpoint.total_hash_count + self.added,
+                content_id_sum=self._content_id_sum(),
+            )
+
+    def _content_id_sum(self) -> t.Optional[int]:
+        if self.checkpoint.content_id_sum is None:
+            return None
+        return self.checkpoint.content_id_sum + self.added_id_sum
+
+
+def build_index(
+    storage: interface.IUnifiedStore,
+    signal_type: t.Type[SignalType],
+    *,
+    incremental: bool = True,
+) -> t.Optional[interface.SignalTypeIndexBuildCheckpoint]:
+    """
+    Build and store the index for one signal type from all banked content.
+
+    If incremental, and the last build's checkpoint is still valid, only
+    the content added since is read and appended to the stored index.
+    Otherwise, the content is exported from the store in bulk, and built
+    from column batches rather than an item at a time.
+
+    Returns None, without building, if another node is building it.
+    """
+    name = signal_type.get_name()
+    with storage.index_build_lock(signal_type) as locked:
+        if not locked:
+            logger.info("%s index is being built by another node, skipping", name)
+            _record_status(lambda: _log_running_build(storage, signal_type))
+            return None
+
+        # Checked under the lock, as another node may have just built it
+        target = storage.get_current_index_build_target(signal_type)
+        if (
+            incremental
+            and storage.get_last_index_build_checkpoint(signal_type) == target
+        ):
+            logger.info("%s index is up to date", name)
+            return target
+
+        _record_status(
+            lambda: storage.index_build_start(
+                signal_type, _node_name(), target.total_hash_count
+            )
+        )
+        try:
+            checkpoint = _build(storage, signal_type, target, incremental)
+        except Exception:
+            _record_status(lambda: storage.index_build_complete(signal_type, False))
+            raise
+        _record_status(lambda: storage.index_build_complete(signal_type, True))
+        return checkpoint
+
+
+def _record_status(write: t.Callable[[], None]) -> None:
+    """The build status is for information, so never fail a build over it"""
+    try:
+        write()
+    except Exception:
+        logger.exception("Failed to record index build status")
+
+
+def _log_running_build(
+    storage: interface.IUnifiedStore, signal_type: t.Type[SignalType]
+) -> None:
+    status = storage.get_index_build_status(signal_type)
+    logger.info(
+        "%s index build by %s is at %d/%d signals",
+        signal_type.get_name(),
+        status.running_build_node,
+        status.signals_added,
+        status.signals_target,
+    )
+
+
+def _build(
+    storage: interface.IUnifiedStore,
+    signal_type: t.Type[SignalType],
+    target: interface.SignalTypeIndexBuildCheckpoint,
+    incremental: bool,
+) -> interface.SignalTypeIndexBuildCheckpoint:
+    if incremental:
+        checkpoint = _build_incremental(storage, signal_type)
+        if checkpoint is not None:
+            return checkpoint
+
+    tracker = _CheckpointTracker(
+        interface.SignalTypeIndexBuildCheckpoint.get_empty(),
+        lambda added: _record_status(
+            lambda: storage.index_build_progress(signal_type, added)
+        ),
+    )
+    batches = tracker.columns(
+        storage.bank_export_content(
+            signal_type, target, settings.index_export_batch_size
+        ),
+        target,
+    )
+    index_cls = get_index_cls(signal_type)
+    index: SignalTypeIndex[int]
+    if issubclass(index_cls, PackedPdqIndex):
+        index = index_cls.from_columns(
+            (batch.signal_vals, batch.bank_content_ids) for batch in batches
+        )
+    else:
+        index = index_cls.build(
+            (val, id)
+            for batch in batches
+            for val, id in zip(batch.signal_vals, batch.bank_content_ids.tolist())
+        )
+    storage.store_signal_type_index(signal_type, index, tracker.checkpoint)
+    logger.info("Built %s index, %d signals", signal_type.get_name(), tracker.added)
+    return tracker.checkpoint
+
+
+def _build_incremental(
+    storage: interface.IUnifiedStore, signal_type: t.Type[SignalType]
+) -> t.Optional[interface.SignalTypeIndexBuildCheckpoint]:
+    """Append new content to the stored index, or None if we can't"""
+    name = signal_type.get_name()
+    checkpoint = storage.get_last_index_build_checkpoint(signal_type)
+    if checkpoint is None:
+        return None
+    items = storage.bank_yield_content_since(signal_type, checkpoint)
+    if items is None:
+        logger.info("%s content changed since the last build, rebuilding", name)
+        return None
+
+    first = next(items, None)
+    if first is None:
+        logger.info("%s index is up to date", name)
+        return checkpoint
+
+    index = storage.get_signal_type_index(signal_type)
+    if index is None or type(index) is not get_index_cls(signal_type):
+        return None
+
+    tracker = _CheckpointTracker(
+        checkpoint,
+        lambda added: _record_status(
+            lambda: storage.index_build_progress(signal_type, added)
+        ),
+    )
+    index.add_all(tracker.entries(itertools.chain((first,), items)))
+    storage.store_signal_type_index(signal_type, index, tracker.checkpoint)
+    logger.info(
+        "Added %d signals to %s index, %d total",
+        tracker.added,
+        name,
+        tracker.checkpoint.total_hash_count,
+    )
+    return tracker.checkpoint
+
+
+def _node_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def build_all_indexes(
+    storage: interface.IUnifiedStore,
+    names: t.Collection[str] = (),
+    *,
+    incremental: bool = True,
+    workers: int = 1,
+) -> None:
+    """
+    Build every enabled signal type's index (or just those named).
+
+    With more than one worker, each signal type is built in its own
+    process, which uses get_storage() rather than storage.
+    """
+    # Prune first, as it's cheap, and a build may fail or take a while
+    storage.bank_content_prune_changes(
+        int(time.time() - settings.content_change_retention)
+    )
+    signal_types = [
+        config.signal_type
+        for name, config in storage.get_signal_type_configs().items()
+        if config.enabled and (not names or name in names)
+    ]
+    if workers > 1 and len(signal_types) > 1:
+        _build_in_processes(storage, signal_types, incremental, workers)
+    else:
+        for signal_type in signal_types:
+            build_index(storage, signal_type, incremental=incremental)
+
+
+def _build_in_processes(
+    storage: interface.IUnifiedStore,
+    signal_types: t.Sequence[t.Type[SignalType]],
+    incremental: bool,
+    workers: int,
+) -> None:
+    """
+    Build each signal type in a worker process.
+
+    The largest are started first, so the whole build takes about as long
+    as the slowest one. A build only starts if its estimated memory fits
+    in what's left of settings.index_build_max_memory, unless nothing else
+    is running, so an index bigger than the budget still gets built.
+    """
+    pending = sorted(
+        (
+            (
+                storage.get_current_index_build_target(st).total_hash_count
+                * ESTIMATED_BYTES_PER_SIGNAL,
+                st.get_name(),
+            )
+            for st in signal_types
+        ),
+        reverse=True,
+    )
+    running: dict[concurrent.futures.Future[t.Any], t.Tuple[int, str]] = {}
+    # spawn, as forked workers would share the parent's database connections
+    with concurrent.futures.ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        while pending or running:
+            in_use = sum(estimate for estimate, _ in running.values())
+            for estimate, name in list(pending):
+                if len(running) >= workers:
+                    break
+                if running and in_use + estimate > settings.index_build_max_memory:
+                    continue
+                logger.info("Building %s index (~%d MiB)", name, estimate >> 20)
+                running[pool.submit(_build_worker, name, incremental)] = (
+                    estimate,
+                    name,
+                )
+                pending.remove((estimate, name))
+                in_use += estimate
+
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                _, name = running.pop(future)
+                try:
+                    future.result()
+                except Exception:
+                    logger.exception("Failed to build %s index", name)
+
+
+def _build_worker(
+    name: str, incremental: bool
+) -> t.Optional[interface.SignalTypeIndexBuildCheckpoint]:
+    logging.basicConfig(level=logging.INFO)
+    storage = get_storage()
+    signal_type = storage.get_signal_type_configs()[name].signal_type
+    return build_index(storage, signal_type, incremental=incremental)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build signal type indexes")
+    parser.add_argument("signal_types", nargs="*", help="default: all enabled")
+    parser.add_argument(
+        "--full", action="store_true", help="rebuild from scratch, even if unchanged"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.index_build_workers,
+        help="build this many signal types at once, each in its own process",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if settings.database_migrate:
+        schema.migrate()
+    build_all_indexes(
+        get_storage(),
+        args.signal_types,
+        incremental=not args.full,
+        workers=args.workers,
+    )
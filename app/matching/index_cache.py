@@ -0,0 +1,340 @@
+"""
+The matcher's in-memory copy of every enabled signal type's index.
+
+Loading an index means transferring and deserializing a large object, so
+it must never happen on the request path. Instead, a background task
+loads every index at startup, and then polls the (cheap) build checkpoint
+of each, only reloading those that have been rebuilt since. Where the store
+can push updates (postgres LISTEN/NOTIFY), a listener wakes the refresh as
+soon as an index is stored, and polling is only the fallback.
+
+A reloaded index is swapped in by replacing the whole mapping, so readers
+never take a lock, and in-flight queries finish against the old index.
+
+With OMM_INDEX_SHARED_DIR set, the workers on a host share one copy of
+each index, loaded by one of them (see shared_index.py).
+
+Which bank each piece of content is in, and whether it's removed or
+disabled, is kept separately (see content_metadata.py), and refreshed on a
+much shorter interval.
+"""
+
+import asyncio
+import contextlib
+from dataclasses import dataclass
+import logging
+import math
+import time
+import typing as t
+
+import anyio
+from threatexchange.signal_type.index import SignalTypeIndex
+from threatexchange.signal_type.signal_base import SignalType
+
+from app.settings import settings
+from app.storage import interface
+from app.storage.adapter import get_storage
+
+from .content_metadata import ContentMetadata
+from .shared_index import SharedIndexDir
+
+logger = logging.getLogger(__name__)
+
+# How often the listener checks whether it should stop
+LISTEN_TIMEOUT = 5.0
+
+_cache: t.Optional["IndexCache"] = None
+
+
+@dataclass
+class CachedIndex:
+    signal_type: t.Type[SignalType]
+    index: SignalTypeIndex[int]
+    checkpoint: interface.SignalTypeIndexBuildCheckpoint
+    loaded_at: float
+    # Of the shared index, if shared
+    generation: int = 0
+
+
+class IndexCache:
+    """
+    Indexes by signal type name, kept up to date by a background task.
+
+    The cache is stale until the first load completes, or if it hasn't
+    been able to check for new indexes or content for max_staleness
+    seconds.
+    """
+
+    def __init__(
+        self,
+        storage: t.Callable[[], interface.IUnifiedStore],
+        *,
+        refresh_interval: float,
+        max_staleness: float,
+        content_refresh_interval: float,
+        content_change_retention: float = math.inf,
+        shared: t.Optional[SharedIndexDir] = None,
+        listen: bool = True,
+    ) -> None:
+        self.storage = storage
+        self.shared = shared
+        self.listen = listen
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.content_refresh_interval = content_refresh_interval
+        self.last_refresh_at: t.Optional[float] = None
+        self.content = ContentMetadata(content_change_retention)
+        self._indexes: t.Mapping[str, CachedIndex] = {}
+        self._tasks: list[asyncio.Task[None]] = []
+        self._listener: t.Optional[asyncio.Task[None]] = None
+        self._wake = asyncio.Event()
+        self._stopping = False
+
+    def get(self, signal_type: str) -> t.Optional[CachedIndex]:
+        return self._indexes.get(signal_type)
+
+    @property
+    def indexes(self) -> t.Mapping[str, CachedIndex]:
+        return self._indexes
+
+    def is_stale(self) -> bool:
+        now = time.time()
+        return any(
+            at is None or now - at > self.max_staleness
+            for at in (self.last_refresh_at, self.content.last_refresh_at)
+        )
+
+    def refresh(self) -> None:
+        """
+        Load any index that has been rebuilt since we last loaded it.
+
+        This blocks for as long as loading takes, so call it from a thread.
+        """
+        if self.shared is not None and not self.shared.try_become_loader():
+            self._refresh_from_shared(self.shared)
+            return
+
+        storage = self.storage()
+        indexes = dict(self._indexes)
+        enabled = {
+            name: config.signal_type
+            for name, config in storage.get_signal_type_configs().items()
+            if config.enabled
+        }
+        for name in set(indexes) - set(enabled):
+            logger.info("Dropping %s index, signal type is disabled", name)
+            del indexes[name]
+            if self.shared is not None:
+                self.shared.unpublish(name)
+
+        for name, signal_type in enabled.items():
+            checkpoint = storage.get_last_index_build_checkpoint(signal_type)
+            if checkpoint is None:
+                continue
+            cached = indexes.get(name)
+            if cached is not None and cached.checkpoint == checkpoint:
+                continue
+
+            start = time.time()
+            generation = 0
+            if self.shared is not None:
+                # Another loader may have published it already
+                manifest = self.shared.manifest(name)
+                if manifest is None or manifest.checkpoint != checkpoint:
+                    index = storage.get_signal_type_index(signal_type)
+                    if index is None:
+                        continue
+                    manifest = self.shared.publish(name, index, checkpoint)
+                index = self.shared.attach(manifest)
+                generation = manifest.generation
+            else:
+                # The checkpoint is read first, so if the index is rebuilt
+                # between the two, we just load it again next time
+                index = storage.get_signal_type_index(signal_type)
+                if index is None:
+                    continue
+            indexes[name] = CachedIndex(
+                signal_type, index, checkpoint, time.time(), generation
+            )
+            # Swap in each index as soon as it's ready
+            self._indexes = dict(indexes)
+            logger.info(
+                "Loaded %s index (%d signals) in %.1fs",
+                name,
+                checkpoint.total_hash_count,
+                time.time() - start,
+            )
+
+        self._indexes = indexes
+        self.last_refresh_at = time.time()
+        if self.shared is not None:
+            self.shared.heartbeat()
+
+    def _refresh_from_shared(self, shared: SharedIndexDir) -> None:
+        """Map any index the loader has published a new generation of"""
+        manifests = shared.manifests()
+        configs = self.storage().get_signal_type_configs()
+        indexes = {
+            name: cached
+            for name, cached in self._indexes.items()
+            if name in manifests and name in configs
+        }
+        for name, manifest in manifests.items():
+            if name not in configs:
+                continue
+            cached = indexes.get(name)
+            if cached is not None and cached.generation == manifest.generation:
+                continue
+            try:
+                index = shared.attach(manifest)
+            except FileNotFoundError:
+                # Replaced twice since we read the manifest, try again next time
+                continue
+            indexes[name] = CachedIndex(
+                configs[name].signal_type,
+                index,
+                manifest.checkpoint,
+                time.time(),
+                manifest.generation,
+            )
+            self._indexes = dict(indexes)
+            logger.info("Mapped %s index generation %d", name, manifest.generation)
+
+        self._indexes = indexes
+        # We're as up to date as the loader is
+        self.last_refresh_at = shared.loader_refreshed_at()
+
+    def refresh_content(self) -> None:
+        self.content.refresh(self.storage())
+
+    async def run(self) -> None:
+        """Refresh the cache forever, until cancelled"""
+        await self._poll(
+            self.refresh,
+            self._index_refresh_interval,
+            "index cache",
+            self._wake,
+            self._start_listener,
+        )
+
+    async def run_content(self) -> None:
+        """Refresh the content metadata forever, until cancelled"""
+        await self._poll(
+            self.refresh_content,
+            lambda: self.content_refresh_interval,
+            "content metadata",
+        )
+
+    async def run_listener(self) -> None:
+        """Wake the refresh whenever an index is stored, until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # The thread blocks in the store, so on cancel, abandon it
+                # to notice _stopping on its next timeout
+                listening = await anyio.to_thread.run_sync(
+                    self._listen, loop, abandon_on_cancel=True
+                )
+                if not listening:
+                    logger.info("Index updates can't be pushed, polling only")
+                    return
+            except Exception:
+                logger.exception("Lost the index update listener, reconnecting")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._stopping = False
+            self._tasks = [
+                asyncio.create_task(self.run()),
+                asyncio.create_task(self.run_content()),
+            ]
+            self._start_listener()
+
+    def _start_listener(self) -> None:
+        # Followers are woken by the loader publishing, not by the store, so
+        # only the loader, which we know after its first refresh, listens
+        if not self.listen or self._listener is not None:
+            return
+        if self.shared is None or self.shared.is_loader:
+            self._listener = asyncio.create_task(self.run_listener())
+            self._tasks.append(self._listener)
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._listener = None
+
+    def _listen(self, loop: asyncio.AbstractEventLoop) -> bool:
+        updates = self.storage().index_updates(LISTEN_TIMEOUT)
+        if updates is None:
+            return False
+        with contextlib.closing(updates):
+            for update in updates:
+                if self._stopping:
+                    break
+                if update is None:
+                    continue
+                name, checkpoint = update
+                cached = self._indexes.get(name)
+                if cached is None or cached.checkpoint != checkpoint:
+                    logger.info("%s index was stored, refreshing", name)
+                    loop.call_soon_threadsafe(self._wake.set)
+        return True
+
+    def _index_refresh_interval(self) -> float:
+        # Following a loader only reads the shared directory, which is cheap
+        # enough to do as often as the content metadata
+        if self.shared is not None and not self.shared.is_loader:
+            return min(self.refresh_interval, self.content_refresh_interval)
+        return self.refresh_interval
+
+    async def _poll(
+        self,
+        refresh: t.Callable[[], None],
+        interval: t.Callable[[], float],
+        what: str,
+        wake: t.Optional[asyncio.Event] = None,
+        refreshed: t.Optional[t.Callable[[], None]] = None,
+    ) -> None:
+        while True:
+            if wake is not None:
+                wake.clear()
+            try:
+                await anyio.to_thread.run_sync(refresh)
+            except Exception:
+                logger.exception("Failed to refresh the %s", what)
+            if refreshed is not None:
+                refreshed()
+            if wake is None:
+                await asyncio.sleep(interval())
+                continue
+            try:
+                await asyncio.wait_for(wake.wait(), interval())
+            except asyncio.TimeoutError:
+                pass
+
+
+def get_index_cache() -> IndexCache:
+    global _cache
+    if _cache is None:
+        _cache = IndexCache(
+            get_storage,
+            refresh_interval=settings.index_cache_refresh_interval,
+            max_staleness=settings.index_cache_max_staleness,
+            content_refresh_interval=settings.content_metadata_refresh_interval,
+            content_change_retention=settings.content_change_retention,
+            shared=(
+                SharedIndexDir(settings.index_shared_dir)
+                if settings.index_shared_dir
+                else None
+            ),
+            listen=settings.index_cache_listen,
+        )
+    return _cache
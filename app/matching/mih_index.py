@@ -0,0 +1,175 @@
+"""
+A multi-index hashing (MIH) PDQ index, for sub-linear lookups.
+
+The 256 bit hash is split into 16 substrings of 16 bits. If two hashes
+are within distance d, then by pigeonhole at least one of their substrings
+is within d // 16, so for PDQ's threshold of 31 some substring is within 1
+bit. For each substring we keep the rows sorted by the substring's value,
+and a query only has to look at the rows whose substring is within that
+radius of its own (17 buckets per substring), rather than at every row.
+
+Candidates are then checked against the full hash, so results (and recall)
+are exactly the same as the brute force PackedPdqIndex.
+
+See benchmarks/pdq_index.py for how the two compare as banks grow.
+"""
+
+import itertools
+import threading
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+
+from .pdq_index import WORDS_IN_PDQ, PackedPdqIndex, Self
+
+SUBSTRING_BITS = 16
+SUBSTRINGS_PER_WORD = 64 // SUBSTRING_BITS
+SUBSTRINGS = WORDS_IN_PDQ * SUBSTRINGS_PER_WORD
+_SUBSTRING_MASK = np.uint64((1 << SUBSTRING_BITS) - 1)
+
+
+def _flip_masks(radius: int) -> npt.NDArray[np.uint16]:
+    """Every SUBSTRING_BITS mask with at most radius bits set"""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in itertools.combinations(range(SUBSTRING_BITS), r):
+            masks.append(sum(1 << b for b in bits))
+    return np.array(masks, dtype=np.uint16)
+
+
+class MIHPdqIndex(PackedPdqIndex):
+    """
+    PackedPdqIndex with a table per 16 bit substring to find candidates.
+
+    Each table is a permutation of the rows sorted by that substring, plus
+    the offset in it where each of the 2^16 substring values starts. They
+    are rebuilt on the next query after entries are added, and serialized
+    with the index so that loading doesn't have to rebuild them.
+    """
+
+    def __init__(self, *args: t.Any, **kwargs: t.Any) -> None:
+        self._tables: t.Optional[
+            t.Tuple[npt.NDArray[np.uint32], npt.NDArray[np.int64]]
+        ] = None
+        self._tables_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def __getstate__(self) -> dict[str, t.Any]:
+        state = self.__dict__.copy()
+        del state["_tables_lock"]
+        return state
+
+    def __setstate__(self, state: dict[str, t.Any]) -> None:
+        self.__dict__.update(state)
+        self._tables_lock = threading.Lock()
+
+    def add_all(self, entries: t.Iterable[t.Tuple[str, int]]) -> None:
+        super().add_all(entries)
+        self._tables = None
+
+    def to_arrays(
+        self,
+    ) -> t.Tuple[t.Mapping[str, npt.NDArray[t.Any]], dict[str, t.Any]]:
+        # Store the tables too, so that loading doesn't have to rebuild them
+        arrays, meta = super().to_arrays()
+        order, offsets = self._get_tables()
+        return {**arrays, "order": order, "offsets": offsets}, meta
+
+    @classmethod
+    def from_arrays(
+        cls: t.Type[Self],
+        arrays: t.Mapping[str, npt.NDArray[t.Any]],
+        meta: dict[str, t.Any],
+    ) -> Self:
+        index = super().from_arrays(arrays, meta)
+        if "order" in arrays:
+            t.cast(MIHPdqIndex, index)._tables = (arrays["order"], arrays["offsets"])
+        return index
+
+    def query_arrays(
+        self, query: npt.NDArray[np.uint64]
+    ) -> t.Tuple[npt.NDArray[np.int64], npt.NDArray[np.uint16]]:
+        rows = self.candidates(query)
+        if not len(rows):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint16)
+
+        distances = np.zeros(len(rows), dtype=np.uint16)
+        for word in range(WORDS_IN_PDQ):
+            distances += np.bitwise_count(self.hashes[word, rows] ^ query[word])
+        matched = distances <= self.threshold
+        return self.ids[rows[matched]], distances[matched]
+
+    def query_arrays_batch(
+        self, queries: npt.NDArray[np.uint64]
+    ) -> list[t.Tuple[npt.NDArray[np.int64], npt.NDArray[np.uint16]]]:
+        # Each query only reads its own candidates, so there's nothing to share
+        return [self.query_arrays(queries[:, q]) for q in range(queries.shape[1])]
+
+    def candidates(self, query: npt.NDArray[np.uint64]) -> npt.NDArray[np.intp]:
+        """The rows that share a substring (within the radius) with query"""
+        order, offsets = self._get_tables()
+        flips = _flip_masks(self.threshold // SUBSTRINGS)
+
+        # The buckets to probe, for all substrings at once
+        probes = _substrings(query.reshape(WORDS_IN_PDQ, 1))[:, 0, None] ^ flips
+        table_base = np.arange(SUBSTRINGS)[:, None] * (1 << SUBSTRING_BITS)
+        starts = offsets[(table_base + probes).ravel()]
+        ends = offsets[(table_base + probes).ravel() + 1]
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=np.intp)
+
+        # Gather all of the bucket slices without a python loop, by
+        # computing the position in order[] of every element of every slice
+        slice_starts = np.cumsum(lengths) - lengths
+        positions = np.arange(total) - np.repeat(slice_starts - starts, lengths)
+        # A row may be found through several substrings, only check it once
+        return np.unique(order[positions]).astype(np.intp)
+
+    def _get_tables(
+        self,
+    ) -> t.Tuple[npt.NDArray[np.uint32], npt.NDArray[np.int64]]:
+        tables = self._tables
+        if tables is None:
+            with self._tables_lock:
+                if self._tables is None:
+                    self._tables = self._build_tables()
+                tables = self._tables
+        return tables
+
+    def _build_tables(
+        self,
+    ) -> t.Tuple[npt.NDArray[np.uint32], npt.NDArray[np.int64]]:
+        """
+        Build the substring tables, flattened into two arrays.
+
+        order[i * n : (i + 1) * n] is every row sorted by substring i, and
+        offsets[i * 2^16 + v] is where substring value v starts in order[]
+        """
+        n = len(self.ids)
+        buckets = 1 << SUBSTRING_BITS
+        order = np.empty(SUBSTRINGS * n, dtype=np.uint32)
+        offsets = np.empty(SUBSTRINGS * buckets + 1, dtype=np.int64)
+        substrings = _substrings(self.hashes)
+        for i in range(SUBSTRINGS):
+            # A stable sort of uint16 is a radix sort
+            order[i * n : (i + 1) * n] = np.argsort(substrings[i], kind="stable")
+            counts = np.bincount(substrings[i], minlength=buckets)
+            offsets[i * buckets] = i * n
+            np.cumsum(counts, out=offsets[i * buckets + 1 : (i + 1) * buckets + 1])
+            offsets[i * buckets + 1 : (i + 1) * buckets + 1] += i * n
+        return order, offsets
+
+
+def _substrings(hashes: npt.NDArray[np.uint64]) -> npt.NDArray[np.uint16]:
+    """Split planar (4, n) hashes into (16, n) 16 bit substrings"""
+    ret = np.empty((SUBSTRINGS, hashes.shape[1]), dtype=np.uint16)
+    for word in range(WORDS_IN_PDQ):
+        for part in range(SUBSTRINGS_PER_WORD):
+            shift = np.uint64(part * SUBSTRING_BITS)
+            ret[word * SUBSTRINGS_PER_WORD + part] = (
+                hashes[word] >> shift
+            ) & _SUBSTRING_MASK
+    return ret
@@ -0,0 +1,235 @@
+"""
+A brute force PDQ index, vectorized with numpy.
+
+Each 256 bit PDQ hash is packed into four uint64 words, so the distance to
+every hash in the index is an XOR and a popcount per word. numpy does both
+in C over the whole array, which is far faster than comparing hex strings
+in python, and needs no native index library.
+
+The words are stored planar (all the first words, then all the second
+words, ...) rather than hash by hash, so that every numpy call runs over
+one contiguous run of memory.
+
+Indexes serialize to the flat format in app.storage.index_format, so they
+can be memory mapped when loaded, rather than unpickled.
+"""
+
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+from threatexchange.signal_type.index import (
+    IndexMatchUntyped,
+    SignalSimilarityInfoWithIntDistance,
+    SignalTypeIndex,
+)
+from threatexchange.signal_type.pdq.pdq_utils import (
+    BITS_IN_PDQ,
+    PDQ_CONFIDENT_MATCH_THRESHOLD,
+)
+
+from app.storage import index_format
+
+PDQIndexMatch = IndexMatchUntyped[SignalSimilarityInfoWithIntDistance, int]
+
+Self = t.TypeVar("Self", bound="PackedPdqIndex")
+
+WORDS_IN_PDQ = BITS_IN_PDQ // 64
+
+
+def pack_hashes(hashes: t.Sequence[str]) -> npt.NDArray[np.uint64]:
+    """Convert hex PDQ hashes into a planar (4, n) array of uint64 words"""
+    if not hashes:
+        return np.empty((WORDS_IN_PDQ, 0), dtype=np.uint64)
+    packed = np.frombuffer(bytes.fromhex("".join(hashes)), dtype=np.uint64)
+    return np.ascontiguousarray(packed.reshape(-1, WORDS_IN_PDQ).T)
+
+
+class PackedPdqIndex(SignalTypeIndex[int]):
+    """
+    PDQ hashes in a packed uint64 array, with a parallel array of ids.
+
+    The values stored are always ints (BankContent ids for OMM), which lets
+    them live in a numpy array too.
+    """
+
+    # Rows are scanned in blocks, so the temporaries stay in cache rather
+    # than allocating a copy of the whole index per query
+    BLOCK_SIZE: t.ClassVar[int] = 64 * 1024
+
+    def __init__(
+        self,
+        entries: t.Iterable[t.Tuple[str, int]] = (),
+        threshold: int = PDQ_CONFIDENT_MATCH_THRESHOLD,
+    ) -> None:
+        super().__init__()
+        self.threshold = threshold
+        self.hashes = np.empty((WORDS_IN_PDQ, 0), dtype=np.uint64)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.add_all(entries)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def get_match_threshold(cls) -> int:
+        return PDQ_CONFIDENT_MATCH_THRESHOLD
+
+    def serialize(self, fout: t.BinaryIO) -> None:
+        index_format.write_flat(self, fout)
+
+    @classmethod
+    def deserialize(cls: t.Type[Self], fin: t.BinaryIO) -> Self:
+        return t.cast(Self, index_format.load_index(fin))
+
+    def to_arrays(
+        self,
+    ) -> t.Tuple[t.Mapping[str, npt.NDArray[t.Any]], dict[str, t.Any]]:
+        return {"hashes": self.hashes, "ids": self.ids}, {"threshold": self.threshold}
+
+    @classmethod
+    def from_arrays(
+        cls: t.Type[Self],
+        arrays: t.Mapping[str, npt.NDArray[t.Any]],
+        meta: dict[str, t.Any],
+    ) -> Self:
+        index = cls(threshold=meta["threshold"])
+        index.hashes = arrays["hashes"]
+        index.ids = arrays["ids"]
+        return index
+
+    @classmethod
+    def from_columns(
+        cls: t.Type[Self],
+        batches: t.Iterable[t.Tuple[t.Sequence[str], npt.NDArray[np.int64]]],
+    ) -> Self:
+        """
+        Build from batches of hashes and their ids, as a bulk export reads
+        them. Each batch is packed at once, and joined only at the end.
+        """
+        hashes = []
+        ids = []
+        for batch_hashes, batch_ids in batches:
+            hashes.append(pack_hashes(batch_hashes))
+            ids.append(batch_ids)
+        index = cls()
+        if ids:
+            index.hashes = np.concatenate(hashes, axis=1)
+            index.ids = np.concatenate(ids)
+        return index
+
+    def query(self, hash: str) -> t.Sequence[PDQIndexMatch]:
+        ids, distances = self.query_arrays(pack_hashes([hash])[:, 0])
+        return [
+            IndexMatchUntyped(SignalSimilarityInfoWithIntDistance(int(d)), int(i))
+            for i, d in zip(ids, distances)
+        ]
+
+    def query_batch(self, hashes: t.Sequence[str]) -> list[t.Sequence[PDQIndexMatch]]:
+        """Look up several hashes at once, which is cheaper than one by one"""
+        return [
+            [
+                IndexMatchUntyped(SignalSimilarityInfoWithIntDistance(int(d)), int(i))
+                for i, d in zip(ids, distances)
+            ]
+            for ids, distances in self.query_arrays_batch(pack_hashes(hashes))
+        ]
+
+    def query_arrays_batch(
+        self, queries: npt.NDArray[np.uint64]
+    ) -> list[t.Tuple[npt.NDArray[np.int64], npt.NDArray[np.uint16]]]:
+        """
+        query_arrays() for a planar (4, q) array of packed hashes.
+
+        Each block of the index is scored against every query while it's
+        in cache, so the index is read from memory once per batch rather
+        than once per query.
+        """
+        n_queries = queries.shape[1]
+        if n_queries == 1:
+            return [self.query_arrays(queries[:, 0])]
+        block_size = max(1, self.BLOCK_SIZE // n_queries)
+        size = min(block_size, len(self.ids))
+        xor = np.empty((n_queries, size), dtype=np.uint64)
+        bits = np.empty((n_queries, size), dtype=np.uint8)
+        distances = np.empty((n_queries, size), dtype=np.uint16)
+
+        found_queries = []
+        found_rows = []
+        found_distances = []
+        for start in range(0, len(self.ids), block_size):
+            end = min(start + block_size, len(self.ids))
+            n = end - start
+            distances[:, :n] = 0
+            for word in range(WORDS_IN_PDQ):
+                np.bitwise_xor(
+                    queries[word, :, None],
+                    self.hashes[None, word, start:end],
+                    out=xor[:, :n],
+                )
+                np.bitwise_count(xor[:, :n], out=bits[:, :n])
+                np.add(distances[:, :n], bits[:, :n], out=distances[:, :n])
+            matched_queries, rows = np.nonzero(distances[:, :n] <= self.threshold)
+            if len(rows):
+                found_queries.append(matched_queries)
+                found_rows.append(start + rows)
+                found_distances.append(distances[matched_queries, rows])
+
+        if not found_rows:
+            empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint16)
+            return [empty] * n_queries
+        query_of = np.concatenate(found_queries)
+        # Group the hits by query, keeping them in row order within each
+        order = np.argsort(query_of, kind="stable")
+        ids = self.ids[np.concatenate(found_rows)[order]]
+        all_distances = np.concatenate(found_distances)[order]
+        bounds = np.searchsorted(query_of[order], np.arange(n_queries + 1))
+        return [
+            (ids[bounds[q] : bounds[q + 1]], all_distances[bounds[q] : bounds[q + 1]])
+            for q in range(n_queries)
+        ]
+
+    def query_arrays(
+        self, query: npt.NDArray[np.uint64]
+    ) -> t.Tuple[npt.NDArray[np.int64], npt.NDArray[np.uint16]]:
+        """
+        Find every entry within the threshold of one packed hash.
+
+        Returns the matching ids and their distances, as arrays.
+        """
+        size = min(self.BLOCK_SIZE, len(self.ids))
+        xor = np.empty(size, dtype=np.uint64)
+        bits = np.empty(size, dtype=np.uint8)
+        distances = np.empty(size, dtype=np.uint16)
+
+        found_ids = []
+        found_distances = []
+        for start in range(0, len(self.ids), self.BLOCK_SIZE):
+            end = min(start + self.BLOCK_SIZE, len(self.ids))
+            n = end - start
+            distances[:n] = 0
+            for word in range(WORDS_IN_PDQ):
+                np.bitwise_xor(self.hashes[word, start:end], query[word], out=xor[:n])
+                np.bitwise_count(xor[:n], out=bits[:n])
+                np.add(distances[:n], bits[:n], out=distances[:n])
+            (rows,) = np.nonzero(distances[:n] <= self.threshold)
+            if len(rows):
+                found_ids.append(self.ids[start + rows])
+                found_distances.append(distances[rows])
+        if not found_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint16)
+        return np.concatenate(found_ids), np.concatenate(found_distances)
+
+    def add(self, signal_str: str, entry: int) -> None:
+        self.add_all(((signal_str, entry),))
+
+    def add_all(self, entries: t.Iterable[t.Tuple[str, int]]) -> None:
+        hashes = []
+        ids = []
+        for signal_str, entry in entries:
+            hashes.append(signal_str)
+            ids.append(entry)
+        if not ids:
+            return
+        self.hashes = np.concatenate((self.hashes, pack_hashes(hashes)), axis=1)
+        self.ids = np.concatenate((self.ids, np.array(ids, dtype=np.int64)))
@@ -0,0 +1,167 @@
+"""
+Sharing loaded indexes between the matcher processes on one host.
+
+Each uvicorn worker would otherwise load its own copy of every index, so a
+host with 32 workers would need 32 times the memory. Instead, one worker
+(whichever holds the directory's lock file) loads indexes from the
+database, and publishes them into a directory on the host - ideally on a
+tmpfs such as /dev/shm. Every worker, the loader included, then memory maps
+the published file read-only, so the host holds one copy of each index
+however many workers it has.
+
+The directory holds, per signal type:
+
+  <name>.<generation>.idx - the index, in the flat format
+  <name>.json             - the current generation, and its checkpoint
+
+and loader.json, which the loader rewrites on every refresh, so workers
+can tell if it has stopped. Publishing writes the new generation's file,
+and then swaps in the manifest with a rename, so workers never see a
+partial index. Old generations are unlinked, which is safe while they are
+still mapped.
+
+Indexes that can't be stored in the flat format are pickled, which saves
+each worker from loading them from the database, but not the memory.
+"""
+
+from dataclasses import asdict, dataclass
+import fcntl
+import json
+import logging
+import os
+from pathlib import Path
+import time
+import typing as t
+
+from threatexchange.signal_type.index import SignalTypeIndex
+
+from app.storage import index_format, interface
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = "loader.lock"
+HEARTBEAT_FILE = "loader.json"
+
+
+@dataclass
+class SharedIndexManifest:
+    name: str
+    generation: int
+    checkpoint: interface.SignalTypeIndexBuildCheckpoint
+
+    @property
+    def filename(self) -> str:
+        return f"{self.name}.{self.generation}.idx"
+
+
+class SharedIndexDir:
+    """A directory that one loader publishes indexes into, for all to map"""
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self._lock_fd: t.Optional[int] = None
+
+    @property
+    def is_loader(self) -> bool:
+        return self._lock_fd is not None
+
+    def try_become_loader(self) -> bool:
+        """
+        Take the loader lock if no other process has it.
+
+        The lock is held until this process exits, at which point the OS
+        releases it, and the next worker to try takes over.
+        """
+        if self._lock_fd is not None:
+            return True
+        self.path.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path / LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        logger.info("Process %d is now loading indexes into %s", os.getpid(), self.path)
+        self._lock_fd = fd
+        return True
+
+    def heartbeat(self) -> None:
+        self._write_json(
+            HEARTBEAT_FILE, {"pid": os.getpid(), "refreshed_at": time.time()}
+        )
+
+    def loader_refreshed_at(self) -> t.Optional[float]:
+        data = self._read_json(HEARTBEAT_FILE)
+        return None if data is None else float(data["refreshed_at"])
+
+    def manifests(self) -> dict[str, SharedIndexManifest]:
+        ret = {}
+        for path in self.path.glob("*.json"):
+            if path.name == HEARTBEAT_FILE:
+                continue
+            manifest = self.manifest(path.stem)
+            if manifest is not None:
+                ret[manifest.name] = manifest
+        return ret
+
+    def manifest(self, name: str) -> t.Optional[SharedIndexManifest]:
+        data = self._read_json(f"{name}.json")
+        if data is None:
+            return None
+        return SharedIndexManifest(
+            name=name,
+            generation=data["generation"],
+            checkpoint=interface.SignalTypeIndexBuildCheckpoint(**data["checkpoint"]),
+        )
+
+    def publish(
+        self,
+        name: str,
+        index: SignalTypeIndex[int],
+        checkpoint: interface.SignalTypeIndexBuildCheckpoint,
+    ) -> SharedIndexManifest:
+        """Publish a new generation of an index. Only the loader may call this"""
+        assert self.is_loader, "Only the loader publishes indexes"
+        previous = self.manifest(name)
+        manifest = SharedIndexManifest(
+            name, 1 if previous is None else previous.generation + 1, checkpoint
+        )
+        tmp = self.path / f".{manifest.filename}.tmp"
+        with tmp.open("wb") as fout:
+            index.serialize(fout)
+        tmp.rename(self.path / manifest.filename)
+        self._write_json(
+            f"{name}.json",
+            {"generation": manifest.generation, "checkpoint": asdict(checkpoint)},
+        )
+        # Keep the previous generation, for workers that read its manifest
+        # just before we replaced it
+        for path in self.path.glob(f"{name}.*.idx"):
+            generation = path.name[len(name) + 1 : -len(".idx")]
+            if generation.isdigit() and int(generation) < manifest.generation - 1:
+                path.unlink(missing_ok=True)
+        return manifest
+
+    def unpublish(self, name: str) -> None:
+        assert self.is_loader, "Only the loader publishes indexes"
+        (self.path / f"{name}.json").unlink(missing_ok=True)
+        for path in self.path.glob(f"{name}.*.idx"):
+            path.unlink(missing_ok=True)
+
+    def attach(self, manifest: SharedIndexManifest) -> SignalTypeIndex[int]:
+        """Map a published index, read-only"""
+        with (self.path / manifest.filename).open("rb") as fin:
+            return index_format.load_index(fin, readonly=True)
+
+    def _read_json(self, filename: str) -> t.Optional[dict[str, t.Any]]:
+        try:
+            return t.cast(
+                dict[str, t.Any], json.loads((self.path / filename).read_text())
+            )
+        except FileNotFoundError:
+            return None
+
+    def _write_json(self, filename: str, data: dict[str, t.Any]) -> None:
+        tmp = self.path / f".{filename}.tmp"
+        tmp.write_text(json.dumps(data))
+        tmp.rename(self.path / filename)
@@ -1,23 +1,29 @@
+import asyncio
+from dataclasses import dataclass
+import functools
 import typing as t
 
-from fastapi import APIRouter, HTTPException, Request, UploadFile
+from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
 from fastapi.exceptions import RequestValidationError
 from pydantic import BaseModel, ValidationError
-from pathlib import Path
 import logging
-import tempfile
 from pydantic_core import InitErrorDetails, PydanticCustomError
-import requests
+from starlette.concurrency import run_in_threadpool
+import httpx
 
 from threatexchange.content_type.content_base import ContentType
-from threatexchange.content_type.photo import PhotoContent
-from threatexchange.content_type.video import VideoContent
-from threatexchange.signal_type.signal_base import FileHasher, BytesHasher, SignalType
-from threatexchange.storage.interfaces import ContentTypeConfig
+from threatexchange.signal_type.signal_base import FileHasher, SignalType
+from threatexchange.storage.interfaces import ContentTypeConfig, SignalTypeConfig
 
 from app.storage.adapter import get_storage
 
+from ..hashing import cache as hash_cache, remote_file
+from ..hashing.admission import get_admission_controller
+from ..hashing.cache import get_hash_cache
+from ..hashing.content_sniffing import SNIFF_LENGTH, sniff_format
+from ..hashing.executor import get_hashing_executor
 from ..hashing.remote_file import is_valid_url
+from ..hashing.streaming import StreamingHasher
 from ..settings import settings
 
 router = APIRouter(tags=["hashing"])
@@ -30,113 +36,316 @@ class HashResult(BaseModel):
 class HashResults(BaseModel):
     results: list[HashResult]
 
+
+class BatchHashResult(BaseModel):
+    url: str | None = None
+    filename: str | None = None
+    results: list[HashResult] | None = None
+    error: str | None = None
+
+
+class BatchHashResults(BaseModel):
+    results: list[BatchHashResult]
+
+
+class AdmissionStats(BaseModel):
+    in_flight: int
+    max_in_flight: int
+    queued: int
+    max_queued: int
+    rejected: int
+    saturated: bool
+
+
+@dataclass
+class HashingConfig:
+    """
+    The content type and signal type config needed to hash content.
+
+    Loading this once per request (rather than per lookup) means a batch
+    only goes to the store once, no matter how many items are in it.
+    """
+
+    content_type_configs: t.Mapping[str, ContentTypeConfig]
+    signal_type_configs: t.Mapping[str, SignalTypeConfig]
+
+    @classmethod
+    def load(cls) -> t.Self:
+        storage = get_storage()
+        return cls(
+            content_type_configs=storage.get_content_type_configs(),
+            signal_type_configs=storage.get_signal_type_configs(),
+        )
+
+
 @router.get("/hash", response_model=HashResults)
 async def hash(request: Request, url: str):
+    async with get_admission_controller().admit():
+        # Config lookups hit the database, so keep them off the event loop
+        config = await run_in_threadpool(HashingConfig.load)
+        hashes = await _hash_url(url, config)
+    return {"results": _as_hash_results(hashes)}
+
+
+@router.post("/hash", response_model=HashResults)
+async def hash_file(file: UploadFile):
+    async with get_admission_controller().admit():
+        config = await run_in_threadpool(HashingConfig.load)
+        hashes = await _hash_upload(file, config)
+    return {"results": _as_hash_results(hashes)}
+
+
+@router.get("/admission", response_model=AdmissionStats)
+async def admission_stats():
+    """
+    Current load on this hasher, for load balancers to shed load on.
+
+    saturated is true when the wait queue is full, and new requests are
+    being turned away with a 429.
+    """
+    return get_admission_controller().stats()
+
+
+@router.post("/hash/batch", response_model=BatchHashResults)
+async def hash_batch(
+    urls: list[str] = Form(default=[]),
+    files: list[UploadFile] = File(default=[]),
+):
+    """
+    Hash many URLs and/or uploaded files in one request.
+
+    Items are hashed concurrently (up to hashing_batch_concurrency at a time),
+    and a failure only fails that item, the error is returned in its place.
+    """
+    if len(urls) + len(files) > settings.hashing_batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batches are limited to {settings.hashing_batch_max_items} items",
+        )
+
+    # A batch takes a slot for each item it may be hashing at once
+    concurrency = min(settings.hashing_batch_concurrency, len(urls) + len(files))
+    async with get_admission_controller().admit(concurrency):
+        config = await run_in_threadpool(HashingConfig.load)
+        results = await _hash_batch(urls, files, config, concurrency)
+    return {"results": results}
+
+
+async def _hash_batch(
+    urls: list[str], files: list[UploadFile], config: HashingConfig, concurrency: int
+) -> list[BatchHashResult]:
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def hash_item(
+        item: BatchHashResult,
+        hashing: t.Callable[[], t.Awaitable[dict[str, str]]],
+    ) -> BatchHashResult:
+        async with semaphore:
+            try:
+                item.results = [
+                    HashResult(**r) for r in _as_hash_results(await hashing())
+                ]
+            except HTTPException as e:
+                item.error = str(e.detail)
+            except RequestValidationError as e:
+                item.error = "; ".join(error["msg"] for error in e.errors())
+            except Exception:
+                logger.exception("Failed to hash %s", item.url or item.filename)
+                item.error = "Failed to hash content"
+        return item
+
+    return await asyncio.gather(
+        *(
+            hash_item(
+                BatchHashResult(url=url), functools.partial(_hash_url, url, config)
+            )
+            for url in urls
+        ),
+        *(
+            hash_item(
+                BatchHashResult(filename=file.filename),
+                functools.partial(_hash_upload, file, config),
+            )
+            for file in files
+        ),
+    )
+
+
+async def _hash_url(url: str, config: HashingConfig) -> dict[str, str]:
     if not is_valid_url(url):
         raise HTTPException(status_code=400, detail="Invalid or unsafe URL provided")
-    
-
-    results = []
-    # If content length is acceptable, proceed with GET request
-    with requests.get(url, stream=True, timeout=30, allow_redirects=True) as response:
-        response.raise_for_status()
-
-        # Double check content length from GET response
-        content_length = response.headers.get("content-length")
-        if content_length is not None and int(content_length) > settings.max_content_length:
-            raise HTTPException(status_code=413, detail="Requested file is too large")
-        
-        content_type = get_content_type(response.headers.get("content-type"), remote=True)
-        signal_types = get_signal_types(content_type)
-        logger.info("%s is type %s", url, content_type)
-
-        with tempfile.NamedTemporaryFile("wb") as tmp:
-                logger.debug("Writing to %s", tmp.name)
-                total_bytes = 0
-                with tmp.file as temp_file:  # this ensures that bytes are flushed before hashing
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            total_bytes += len(chunk)
-                            # Check as we write the file to ensure we don't exceed the max content length
-                            if total_bytes > settings.max_content_length:
-                                raise HTTPException(status_code=413, detail="Requested file is too large")
-
-                            temp_file.write(chunk)
-
-                path = Path(tmp.name)
-
-                for st in signal_types.values():
-                    if issubclass(st, FileHasher):
-                        results.append({
-                            'signal_name': st.get_name(),
-                            'hash': st.hash_from_file(path)
-                        })
-        
-    return { 'results': results }
 
-@router.post("/hash", response_model=HashResults)
-def hash_file(file: UploadFile):
-    results = []
+    cache = get_hash_cache()
+
+    # If we've fetched this URL before, ask the server whether it has changed
+    # since, and if not reuse the hashes without transferring the body
+    cached_fetch = None
+    if cache is not None:
+        cached_fetch = await cache.get_fetch(url)
+        if (
+            cached_fetch is not None
+            and cached_fetch.content_type not in config.content_type_configs
+        ):
+            cached_fetch = None
+        if cached_fetch is not None:
+            cached_signal_types = get_signal_types(
+                _get_enabled_content_type(cached_fetch.content_type, config), config
+            )
+            if not cached_fetch.covers(cached_signal_types):
+                cached_fetch = None
+
+    async with remote_file.fetch(
+        url, headers=cached_fetch.conditional_headers() if cached_fetch else None
+    ) as response:
+        if cached_fetch is not None and (
+            response.status_code == httpx.codes.NOT_MODIFIED
+            or cached_fetch.is_unchanged(response.headers)
+        ):
+            logger.info("%s is not modified", url)
+            return {name: cached_fetch.hashes[name] for name in cached_signal_types}
+
+        content_type, hashes = await _hash_stream(
+            remote_file.iter_limited(response), config, remote=True
+        )
+        logger.info("%s is type %s", url, content_type.get_name())
+
+        if cache is not None:
+            fetch = hash_cache.CachedFetch.from_response(
+                response.headers, content_type.get_name(), hashes
+            )
+            if fetch is not None:
+                await cache.set_fetch(url, fetch)
+        return hashes
+
+
+async def _hash_upload(file: UploadFile, config: HashingConfig) -> dict[str, str]:
     if file.size is not None and file.size > settings.max_content_length:
-        raise ValueError("File content is too large")
-
-    content_type = get_content_type(file.content_type)
-    signal_types = get_signal_types(content_type)
-    
-    logger.info("%s is type %s", file.filename, content_type)
-
-    bytes = file.file.read()
-    for st in signal_types.values():
-        if issubclass(st, BytesHasher):
-            results.append({
-                'signal_name': st.get_name(),
-                'hash': st.hash_from_bytes(bytes)
-            })
-    
-    return { 'results': results }
-
-def get_content_type(content_type: str, remote: bool = False) -> t.Type[ContentType]:
-    content_type_configs = get_storage().get_content_type_configs()
-    config: ContentTypeConfig
-
-    if content_type.lower().startswith("image"):
-        config = content_type_configs.get(PhotoContent.get_name())
-    elif content_type.lower().startswith("video") or content_type.lower() == 'application/octet-stream':
-        config = content_type_configs.get(VideoContent.get_name())
-    else:
+        raise HTTPException(status_code=413, detail="File content is too large")
+
+    content_type, hashes = await _hash_stream(_iter_upload(file), config)
+    logger.info("%s is type %s", file.filename, content_type.get_name())
+    return hashes
+
+
+async def _iter_upload(file: UploadFile) -> t.AsyncIterator[bytes]:
+    total_bytes = 0
+    while chunk := await file.read(settings.fetch_chunk_size):
+        total_bytes += len(chunk)
+        if total_bytes > settings.max_content_length:
+            raise HTTPException(status_code=413, detail="File content is too large")
+        yield chunk
+
+
+async def _hash_stream(
+    chunks: t.AsyncIterator[bytes], config: HashingConfig, remote: bool = False
+) -> tuple[t.Type[ContentType], dict[str, str]]:
+    """
+    Hash a stream of content, deciding what it is from its first bytes.
+
+    Content we can't hash is rejected before the rest of the stream is read.
+    """
+    head = bytearray()
+    async for chunk in chunks:
+        head += chunk
+        if len(head) >= SNIFF_LENGTH:
+            break
+
+    content_type = get_content_type(bytes(head[:SNIFF_LENGTH]), config, remote=remote)
+    signal_types = get_signal_types(content_type, config)
+
+    cache = get_hash_cache()
+    with StreamingHasher(
+        [st for st in signal_types.values() if issubclass(st, FileHasher)],
+        max_memory_size=settings.hashing_max_memory_size,
+        content_digest=cache is not None,
+    ) as hasher:
+        await hasher.update(bytes(head))
+        async for chunk in chunks:
+            await hasher.update(chunk)
+
+        if cache is None:
+            return content_type, await hasher.finish(get_hashing_executor())
+
+        content_key = hash_cache.content_key(hasher.content_digest)
+        hashes = await cache.get(content_key, signal_types)
+        if hashes is None:
+            hashes = await hasher.finish(get_hashing_executor())
+            await cache.set(content_key, hashes)
+        return content_type, hashes
+
+
+def _as_hash_results(hashes: dict[str, str]) -> list[dict[str, str]]:
+    return [
+        {"signal_name": signal_name, "hash": hash}
+        for signal_name, hash in hashes.items()
+    ]
+
+
+def get_content_type(
+    head: bytes, hashing_config: HashingConfig, remote: bool = False
+) -> t.Type[ContentType]:
+    """
+    Work out the content type from the first bytes of the content.
+
+    Content-Type headers and filenames are too often missing or wrong to go
+    by, but the magic bytes at the start of a file rarely are.
+    """
+    sniffed = sniff_format(head)
+    if sniffed is None:
         raise RequestValidationError(
             errors=(
                 ValidationError.from_exception_data(
                     "ValueError",
                     [
                         InitErrorDetails(
-                            type=PydanticCustomError("value_error", "Unsupported content-type"),
-                            loc=("query", "url", "response", "headers", "content-type") if remote else ("body", "file", "content-type"),
+                            type=PydanticCustomError(
+                                "value_error", "Unsupported content type"
+                            ),
+                            loc=(
+                                ("query", "url", "response", "body")
+                                if remote
+                                else ("body", "file")
+                            ),
                         )
                     ],
                 )
             ).errors()
         )
-    
+
+    return _get_enabled_content_type(sniffed.content_type.get_name(), hashing_config)
+
+
+def _get_enabled_content_type(
+    name: str, hashing_config: HashingConfig
+) -> t.Type[ContentType]:
+    config = hashing_config.content_type_configs.get(name)
     if config is None:
         raise HTTPException(400, 'Unknown content type')
 
     if not config.enabled:
-        raise HTTPException(400, 'Content type {content_type} is disabled')
+        raise HTTPException(400, f"Content type {name} is disabled")
 
     return config.content_type
 
 
-def get_signal_types(content_type: ContentType) -> t.Mapping[str, t.Type[SignalType]]:
-    signal_types = get_storage().get_enabled_signal_types_for_content_type(content_type)
+def get_signal_types(
+    content_type: t.Type[ContentType], hashing_config: HashingConfig
+) -> t.Mapping[str, t.Type[SignalType]]:
+    # Same as IUnifiedStore.get_enabled_signal_types_for_content_type, but
+    # against the already loaded config
+    signal_types = {
+        name: config.signal_type
+        for name, config in hashing_config.signal_type_configs.items()
+        if config.enabled and content_type in config.signal_type.get_content_types()
+    }
     if not signal_types:
         raise HTTPException(500, "No signal types configured!")
 
     return signal_types
     # if content_type.get_name() == VideoContent.get_name():
     #     return [VideoMD5Signal]
-    
+
     # if content_type.get_name() == PhotoContent.get_name():
     #     return [PdqSignal]
 
-    # return []
\ No newline at end of file
+    # return []
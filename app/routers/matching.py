@@ -1,7 +1,145 @@
-from fastapi import APIRouter
+import logging
+import typing as t
 
-router = APIRouter()
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
-@router.get("/match", tags=["matching"])
-async def match():
-    return {"success": "ok"}
+from threatexchange.signal_type.signal_base import SignalType
+
+from app.settings import settings
+from app.storage.adapter import get_storage
+
+from ..matching.batcher import MicroBatcher
+from ..matching.index_cache import get_index_cache
+from ..matching.pdq_index import PackedPdqIndex
+
+router = APIRouter(tags=["matching"])
+logger = logging.getLogger("uvicorn.error")
+
+_batchers: dict[str, MicroBatcher[str, list[dict[str, t.Any]]]] = {}
+
+
+class Match(BaseModel):
+    bank_content_id: int
+    bank: str
+    distance: str
+
+
+class MatchResults(BaseModel):
+    matches: list[Match]
+
+
+class IndexStatus(BaseModel):
+    signal_type: str
+    signal_count: int
+    updated_to_ts: int
+    loaded_at: float
+    generation: int
+
+
+class IndexCacheStatus(BaseModel):
+    stale: bool
+    last_refresh_at: float | None
+    content_count: int
+    content_refreshed_at: float | None
+    indexes: list[IndexStatus]
+
+
+@router.get("/match", response_model=MatchResults)
+async def match(signal_type: str, signal: str):
+    """
+    Look up a signal (hash) against the index for its signal type.
+
+    Returns the id and bank of every piece of bank content within the
+    signal type's match threshold, that is enabled for matching.
+    """
+    st = await run_in_threadpool(_get_signal_type, signal_type)
+    try:
+        signal = st.validate_signal_str(signal)
+    except Exception:
+        raise HTTPException(400, f"Invalid {signal_type} signal")
+
+    if settings.match_batching_enabled:
+        matches = await _get_batcher(st).submit(signal)
+    else:
+        # Queries against a large index take a while, so keep them off the event loop
+        matches = await run_in_threadpool(_query, st, signal)
+    return {"matches": matches}
+
+
+@router.get("/index/status", response_model=IndexCacheStatus)
+async def index_status():
+    """The indexes this matcher has loaded, and how up to date they are"""
+    cache = get_index_cache()
+    return {
+        "stale": cache.is_stale(),
+        "last_refresh_at": cache.last_refresh_at,
+        "content_count": len(cache.content),
+        "content_refreshed_at": cache.content.last_refresh_at,
+        "indexes": [
+            {
+                "signal_type": name,
+                "signal_count": cached.checkpoint.total_hash_count,
+                "updated_to_ts": cached.checkpoint.last_item_timestamp,
+                "loaded_at": cached.loaded_at,
+                "generation": cached.generation,
+            }
+            for name, cached in cache.indexes.items()
+        ],
+    }
+
+
+def _get_signal_type(name: str) -> t.Type[SignalType]:
+    config = get_storage().get_signal_type_configs().get(name)
+    if config is None:
+        raise HTTPException(400, f"Unknown signal type {name}")
+    if not config.enabled:
+        raise HTTPException(400, f"Signal type {name} is disabled")
+    return config.signal_type
+
+
+def _get_batcher(
+    signal_type: t.Type[SignalType],
+) -> MicroBatcher[str, list[dict[str, t.Any]]]:
+    name = signal_type.get_name()
+    batcher = _batchers.get(name)
+    if batcher is None:
+        batcher = _batchers[name] = MicroBatcher(
+            lambda signals: _query_batch(signal_type, signals),
+            window=settings.match_batch_window,
+            max_size=settings.match_batch_max_size,
+        )
+    return batcher
+
+
+def _query(signal_type: t.Type[SignalType], signal: str) -> list[dict[str, t.Any]]:
+    return _query_batch(signal_type, [signal])[0]
+
+
+def _query_batch(
+    signal_type: t.Type[SignalType], signals: list[str]
+) -> list[list[dict[str, t.Any]]]:
+    cache = get_index_cache()
+    cached = cache.get(signal_type.get_name())
+    if cached is None:
+        raise HTTPException(503, f"No index loaded for {signal_type.get_name()}")
+    index = cached.index
+    if isinstance(index, PackedPdqIndex) and len(signals) > 1:
+        results = index.query_batch(signals)
+    else:
+        results = [index.query(signal) for signal in signals]
+
+    storage = get_storage()
+    return [
+        [
+            {
+                "bank_content_id": match.metadata,
+                "bank": bank,
+                "distance": match.similarity_info.pretty_str(),
+            }
+            # The index may still hold content removed or disabled since it was built
+            for match, bank in cache.content.resolve(matches, storage)
+        ]
+        for matches in results
+    ]
@@ -1,8 +1,14 @@
+import tempfile
+import typing as t
+
 from pydantic import PostgresDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
   database_url: PostgresDsn
+  # Apply OMM's schema migrations (see app/storage/database/schema.py) on
+  # startup. Turn off to apply them separately, before deploying.
+  database_migrate: bool = True
 
   role_matcher: bool = True
   role_hasher: bool = True
@@ -12,6 +18,104 @@ class Settings(BaseSettings):
   allowed_hostnames: set[str] = set()
   max_content_length: int = 1 * 1024 * 1024  # 100MB max file size
 
+  # Remote file fetching (GET /h/hash)
+  fetch_timeout: float = 30.0
+  fetch_chunk_size: int = 64 * 1024
+  fetch_max_connections: int = 200
+  fetch_max_keepalive_connections: int = 50
+  fetch_keepalive_expiry: float = 30.0
+  fetch_max_connections_per_host: int = 16
+
+  # Process pool for CPU-bound hashing. Each worker has its own, so this
+  # defaults to the host's cores divided by WEB_CONCURRENCY, the worker
+  # count uvicorn and gunicorn read. If you pass --workers instead, set
+  # this too. Set the size to 0 to hash in the threadpool instead.
+  hashing_pool_size: int | None = None
+  hashing_pool_max_tasks_per_child: int | None = 1000
+  hashing_pool_max_queue_depth: int = 64
+  # Content that can't be hashed incrementally is buffered in memory up to
+  # this size, and spilled to a temporary file past it
+  hashing_max_memory_size: int = 16 * 1024 * 1024
+
+  # Cache of hash results, keyed by content digest or URL + ETag/Last-Modified.
+  # "sqlite" shares the cache between all the workers on a host.
+  hash_cache_backend: t.Literal["none", "memory", "sqlite"] = "memory"
+  hash_cache_max_entries: int = 100_000
+  hash_cache_ttl: int = 24 * 60 * 60
+  hash_cache_path: str = f"{tempfile.gettempdir()}/fhm_hash_cache.sqlite3"
+
+  # In-process cache of config read from the database, in seconds. Writes
+  # through this process invalidate it immediately, others after the TTL.
+  config_cache_enabled: bool = True
+  config_cache_signal_types_ttl: float = 30.0
+  config_cache_exchange_apis_ttl: float = 30.0
+  config_cache_exchanges_ttl: float = 30.0
+  config_cache_banks_ttl: float = 30.0
+
+  # Exchange fetches that create at least this many records load them with
+  # COPY into staging tables, and merge them in with one statement.
+  exchange_copy_min_records: int = 1000
+
+  # How indices are stored in the database. "chunked" splits them into zstd
+  # compressed chunks, written and read in parallel over several connections.
+  index_storage: t.Literal["large_object", "chunked"] = "chunked"
+  index_chunk_size: int = 16 * 1024 ** 2
+  index_chunk_parallelism: int = 4
+  index_chunk_compression_level: int = 3
+
+  # If set, indices loaded from the database are kept in this directory,
+  # and loaded from it instead while still current, up to max bytes.
+  index_snapshot_dir: t.Optional[str] = None
+  index_snapshot_max_bytes: int = 20 * 1024 ** 3
+
+  # The index built for PDQ. "mih" (multi-index hashing) is sub-linear in
+  # the bank size, "packed" is a brute force scan that needs less memory.
+  pdq_index_type: t.Literal["packed", "mih"] = "mih"
+
+  # Index builds run each signal type in its own process, up to this many
+  # at once, while their estimated memory use fits in the budget.
+  index_build_workers: int = 4
+  index_build_max_memory: int = 8 * 1024 ** 3
+  # Full builds read a signal type's content in this many content id
+  # ranges at once, each over its own connection.
+  index_export_parallelism: int = 4
+  index_export_batch_size: int = 10_000
+
+  # The matcher polls for rebuilt indexes every refresh interval, and
+  # reports itself stale if it hasn't managed to for max staleness seconds.
+  index_cache_refresh_interval: float = 30.0
+  index_cache_max_staleness: float = 300.0
+  # Reload indexes as soon as they're stored, via postgres LISTEN/NOTIFY,
+  # rather than waiting for the next poll.
+  index_cache_listen: bool = True
+  # If set, the workers on a host share one copy of each index, published
+  # into this directory by one of them. Best on a tmpfs, e.g. /dev/shm/omm.
+  index_shared_dir: t.Optional[str] = None
+  # New, removed and disabled content is picked up much more often, as it's
+  # a cheap query.
+  content_metadata_refresh_interval: float = 2.0
+  # Removals and disables are kept in the change log this long, for
+  # matchers to catch up on. One that falls further behind reloads all the
+  # content metadata instead.
+  content_change_retention: float = 3600.0
+
+  # Micro-batching for /m/match. Lookups that arrive within the window (or
+  # until the batch is full) are scored against the index together.
+  match_batching_enabled: bool = False
+  match_batch_window: float = 0.002
+  match_batch_max_size: int = 64
+
+  # Admission control for /h. Requests past the in-flight limit wait in a
+  # bounded queue, and past that (or after the timeout) get a 429.
+  hashing_max_in_flight: int = 64
+  hashing_max_queued: int = 256
+  hashing_queue_timeout: float = 10.0
+  hashing_retry_after: int = 1
+
+  # POST /h/hash/batch
+  hashing_batch_max_items: int = 500
+  hashing_batch_concurrency: int = 32
+
   model_config = SettingsConfigDict(env_file=".env", env_prefix="OMM_")
 
 settings = Settings()
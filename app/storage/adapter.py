@@ -14,9 +14,12 @@ SQLAlchemy isn't going to be enough. Thus an even more abstract
 accessor.
 """
 
+from functools import lru_cache
 import typing as t
 
+from app.settings import settings
 from app.storage.interface import IUnifiedStore
+from app.storage.caching import CachingOMMStore
 from app.storage.database.interface import DefaultOMMStore
 
 from threatexchange.signal_type.pdq.signal import PdqSignal
@@ -31,13 +34,15 @@ from threatexchange.exchanges.impl.fb_threatexchange_api import (
 )
 
 
+@lru_cache
 def get_storage() -> IUnifiedStore:
     """
-    Get the storage interface for the current app flask instance
+    Get the storage interface for this process.
 
-    Holdover from earlier development, maybe remove someday.
+    The store is created once and shared, with rarely changing config
+    cached in front of the database (see CachingOMMStore).
     """
-    return t.cast(IUnifiedStore, DefaultOMMStore(
+    store = DefaultOMMStore(
         signal_types=[PdqSignal, VideoMD5Signal],
         content_types=[PhotoContent, VideoContent],
         exchange_types=[
@@ -46,4 +51,15 @@ def get_storage() -> IUnifiedStore:
             NCMECSignalExchangeAPI,
             StopNCIISignalExchangeAPI,
         ],
-    ))
+    )
+    if not settings.config_cache_enabled:
+        return t.cast(IUnifiedStore, store)
+    return CachingOMMStore(
+        store,
+        ttls={
+            "get_signal_type_configs": settings.config_cache_signal_types_ttl,
+            "exchange_apis_get_configs": settings.config_cache_exchange_apis_ttl,
+            "exchanges_get": settings.config_cache_exchanges_ttl,
+            "get_banks": settings.config_cache_banks_ttl,
+        },
+    )
@@ -0,0 +1,299 @@
+"""
+A caching layer in front of another IUnifiedStore.
+
+Config like signal type overrides, exchange API settings and banks rarely
+changes, but is read several times on every hash or match request. This
+wrapper keeps it in memory for a short, per-method TTL, and drops it
+whenever it is written through this store.
+
+Writes made by other processes are only seen once the TTL expires.
+"""
+
+import threading
+import time
+import typing as t
+
+from threatexchange.exchanges.fetch_state import (
+    CollaborationConfigBase,
+    FetchCheckpointBase,
+    FetchedSignalMetadata,
+    TUpdateRecordKey,
+)
+from threatexchange.exchanges.signal_exchange_api import TSignalExchangeAPI
+from threatexchange.signal_type.index import SignalTypeIndex
+from threatexchange.signal_type.signal_base import SignalType
+from threatexchange.storage.interfaces import SignalTypeConfig
+
+from app.storage import interface
+
+T = t.TypeVar("T")
+
+
+class CachingOMMStore(interface.IUnifiedStore):
+    """
+    Wraps another store, caching the config reads on the hot request paths.
+    """
+
+    DEFAULT_TTLS: t.ClassVar[t.Mapping[str, float]] = {
+        "get_content_type_configs": 300.0,
+        "get_signal_type_configs": 30.0,
+        "exchange_apis_get_configs": 30.0,
+        "exchanges_get": 30.0,
+        "get_banks": 30.0,
+    }
+
+    def __init__(
+        self,
+        store: interface.IUnifiedStore,
+        *,
+        ttls: t.Optional[t.Mapping[str, float]] = None,
+    ) -> None:
+        self.store = store
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self._cache: dict[str, tuple[float, t.Any]] = {}
+        # Bumped by every invalidate(), so a read racing one isn't stored
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self, *names: str) -> None:
+        """Drop cached results for the given methods, or everything"""
+        with self._lock:
+            self._generation += 1
+            if not names:
+                self._cache.clear()
+            for name in names:
+                self._cache.pop(name, None)
+
+    def _cached(self, name: str, fn: t.Callable[[], T]) -> T:
+        now = time.monotonic()
+        entry = self._cache.get(name)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        with self._lock:
+            generation = self._generation
+        value = fn()
+        with self._lock:
+            # fn() may have read from before a write that invalidated since
+            if self._generation == generation:
+                self._cache[name] = (now + self.ttls[name], value)
+        return value
+
+    # Content types
+    def get_content_type_configs(self) -> t.Mapping[str, interface.ContentTypeConfig]:
+        return self._cached(
+            "get_content_type_configs", self.store.get_content_type_configs
+        )
+
+    # Signal types
+    def get_signal_type_configs(self) -> t.Mapping[str, SignalTypeConfig]:
+        return self._cached(
+            "get_signal_type_configs", self.store.get_signal_type_configs
+        )
+
+    def _create_or_update_signal_type_override(
+        self, signal_type: str, enabled_ratio: float
+    ) -> None:
+        self.store._create_or_update_signal_type_override(signal_type, enabled_ratio)
+        self.invalidate("get_signal_type_configs")
+
+    # Index
+    def get_signal_type_index(
+        self, signal_type: t.Type[SignalType]
+    ) -> t.Optional[SignalTypeIndex[int]]:
+        return self.store.get_signal_type_index(signal_type)
+
+    def store_signal_type_index(
+        self,
+        signal_type: t.Type[SignalType],
+        index: SignalTypeIndex,
+        checkpoint: interface.SignalTypeIndexBuildCheckpoint,
+    ) -> None:
+        self.store.store_signal_type_index(signal_type, index, checkpoint)
+
+    def get_last_index_build_checkpoint(
+        self, signal_type: t.Type[SignalType]
+    ) -> t.Optional[interface.SignalTypeIndexBuildCheckpoint]:
+        return self.store.get_last_index_build_checkpoint(signal_type)
+
+    def index_updates(
+        self, timeout: float
+    ) -> t.Optional[
+        t.Iterator[t.Optional[t.Tuple[str, interface.SignalTypeIndexBuildCheckpoint]]]
+    ]:
+        return self.store.index_updates(timeout)
+
+    def index_build_lock(
+        self, signal_type: t.Type[SignalType]
+    ) -> t.ContextManager[bool]:
+        return self.store.index_build_lock(signal_type)
+
+    def get_index_build_status(
+        self, signal_type: t.Type[SignalType]
+    ) -> interface.SignalTypeIndexBuildStatus:
+        return self.store.get_index_build_status(signal_type)
+
+    def index_build_start(
+        self, signal_type: t.Type[SignalType], node: str, signals_target: int
+    ) -> None:
+        self.store.index_build_start(signal_type, node, signals_target)
+
+    def index_build_progress(
+        self, signal_type: t.Type[SignalType], signals_added: int
+    ) -> None:
+        self.store.index_build_progress(signal_type, signals_added)
+
+    def index_build_complete(
+        self, signal_type: t.Type[SignalType], succeeded: bool
+    ) -> None:
+        self.store.index_build_complete(signal_type, succeeded)
+
+    # Exchanges
+    def exchange_apis_get_configs(
+        self,
+    ) -> t.Mapping[str, interface.SignalExchangeAPIConfig]:
+        return self._cached(
+            "exchange_apis_get_configs", self.store.exchange_apis_get_configs
+        )
+
+    def exchange_api_config_update(
+        self, cfg: interface.SignalExchangeAPIConfig
+    ) -> None:
+        self.store.exchange_api_config_update(cfg)
+        self.invalidate("exchange_apis_get_configs")
+
+    def exchange_update(
+        self, cfg: CollaborationConfigBase, *, create: bool = False
+    ) -> None:
+        self.store.exchange_update(cfg, create=create)
+        # Creating an exchange also creates its bank
+        self.invalidate("exchanges_get", "get_banks")
+
+    def exchange_delete(self, name: str) -> None:
+        self.store.exchange_delete(name)
+        self.invalidate("exchanges_get", "get_banks")
+
+    def exchanges_get(self) -> t.Mapping[str, CollaborationConfigBase]:
+        return self._cached("exchanges_get", self.store.exchanges_get)
+
+    def exchange_get_fetch_status(self, name: str) -> interface.FetchStatus:
+        return self.store.exchange_get_fetch_status(name)
+
+    def exchange_get_fetch_checkpoint(
+        self, name: str
+    ) -> t.Optional[FetchCheckpointBase]:
+        return self.store.exchange_get_fetch_checkpoint(name)
+
+    def exchange_get_client(
+        self, collab_config: CollaborationConfigBase
+    ) -> TSignalExchangeAPI:
+        return self.store.exchange_get_client(collab_config)
+
+    def exchange_start_fetch(self, collab_name: str) -> None:
+        self.store.exchange_start_fetch(collab_name)
+
+    def exchange_complete_fetch(
+        self, collab_name: str, *, is_up_to_date: bool, exception: bool
+    ) -> None:
+        self.store.exchange_complete_fetch(
+            collab_name, is_up_to_date=is_up_to_date, exception=exception
+        )
+
+    def exchange_commit_fetch(
+        self,
+        collab: CollaborationConfigBase,
+        old_checkpoint: t.Optional[FetchCheckpointBase],
+        dat: t.Dict[str, t.Any],
+        checkpoint: FetchCheckpointBase,
+    ) -> None:
+        self.store.exchange_commit_fetch(collab, old_checkpoint, dat, checkpoint)
+
+    def exchange_get_data(
+        self,
+        collab_name: str,
+        key: TUpdateRecordKey,
+    ) -> FetchedSignalMetadata:
+        return self.store.exchange_get_data(collab_name, key)
+
+    # Banks
+    def get_banks(self) -> t.Mapping[str, interface.BankConfig]:
+        return self._cached("get_banks", self.store.get_banks)
+
+    def bank_update(
+        self,
+        bank: interface.BankConfig,
+        *,
+        create: bool = False,
+        rename_from: t.Optional[str] = None,
+    ) -> None:
+        self.store.bank_update(bank, create=create, rename_from=rename_from)
+        self.invalidate("get_banks")
+
+    def bank_delete(self, name: str) -> None:
+        self.store.bank_delete(name)
+        self.invalidate("get_banks")
+
+    def bank_content_get(
+        self, ids: t.Iterable[int]
+    ) -> t.Sequence[interface.BankContentConfig]:
+        return self.store.bank_content_get(ids)
+
+    def bank_content_update(self, val: interface.BankContentConfig) -> None:
+        self.store.bank_content_update(val)
+
+    def bank_add_content(
+        self,
+        bank_name: str,
+        content_signals: t.Dict[t.Type[SignalType], str],
+        config: t.Optional[interface.BankContentConfig] = None,
+    ) -> int:
+        return self.store.bank_add_content(bank_name, content_signals, config)
+
+    def bank_remove_content(self, bank_name: str, content_id: int) -> int:
+        return self.store.bank_remove_content(bank_name, content_id)
+
+    def get_current_index_build_target(
+        self, signal_type: t.Type[SignalType]
+    ) -> interface.SignalTypeIndexBuildCheckpoint:
+        return self.store.get_current_index_build_target(signal_type)
+
+    def bank_yield_content(
+        self,
+        signal_type: t.Optional[t.Type[SignalType]] = None,
+        batch_size: int = 100,
+    ) -> t.Iterator[interface.BankContentIterationItem]:
+        return self.store.bank_yield_content(signal_type, batch_size)
+
+    def bank_yield_content_since(
+        self,
+        signal_type: t.Type[SignalType],
+        checkpoint: interface.SignalTypeIndexBuildCheckpoint,
+        batch_size: int = 100,
+    ) -> t.Optional[t.Iterator[interface.BankContentIterationItem]]:
+        return self.store.bank_yield_content_since(signal_type, checkpoint, batch_size)
+
+    def bank_export_content(
+        self,
+        signal_type: t.Type[SignalType],
+        upto: interface.SignalTypeIndexBuildCheckpoint,
+        batch_size: int = 10_000,
+    ) -> t.Iterator[interface.BankContentColumns]:
+        return self.store.bank_export_content(signal_type, upto, batch_size)
+
+    def bank_content_get_changes(
+        self, after: t.Tuple[int, int] = (0, 0), limit: int = 10_000
+    ) -> t.Sequence[interface.BankContentChangeItem]:
+        return self.store.bank_content_get_changes(after, limit)
+
+    def bank_content_get_changes_start(self) -> t.Tuple[int, int]:
+        return self.store.bank_content_get_changes_start()
+
+    def get_banks_by_id(self) -> t.Mapping[int, interface.BankConfig]:
+        return self.store.get_banks_by_id()
+
+    def bank_content_get_metadata(
+        self, after_id: int = 0, limit: int = 10_000
+    ) -> t.Sequence[interface.BankContentMetadataItem]:
+        return self.store.bank_content_get_metadata(after_id, limit)
+
+    def bank_content_prune_changes(self, before_ts: int) -> None:
+        self.store.bank_content_prune_changes(before_ts)
@@ -3,24 +3,46 @@
 """
 The default store for accessing persistent data on OMM.
 """
+import contextlib
+import dataclasses
 from dataclasses import dataclass
+import json
 import pickle
+import select as select_module
 import time
 import typing as t
 
+from app.settings import settings
 from app.storage import interface
-from app.storage.database.connection import create_session
+from app.storage.database.bulk_copy import copy_rows
+from app.storage.database.connection import create_session, engine
 from app.storage.database.models.bank import Bank
 from app.storage.database.models.bank_content import BankContent
-from app.storage.database.models.content_signal import ContentSignal
+from app.storage.database.models.bank_content_change import BankContentChange
+from app.storage.database.models.content_signal import ContentSignal, export_signals
 from app.storage.database.models.exchange_api_config import ExchangeAPIConfig
 from app.storage.database.models.exchange_config import ExchangeConfig
 from app.storage.database.models.exchange_data import ExchangeData
 from app.storage.database.models.exchange_fetch_status import ExchangeFetchStatus
 from app.storage.database.models.signal_index import SignalIndex
+from app.storage.database.models.signal_index_build_status import (
+    SignalIndexBuildStatus,
+)
 from app.storage.database.models.signal_type_override import SignalTypeOverride
 
-from sqlalchemy import select, delete, func, Select, insert, update
+import psycopg2.extensions
+from sqlalchemy import (
+    select,
+    delete,
+    func,
+    Select,
+    insert,
+    literal,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import joinedload
 from sqlalchemy.sql.expression import ClauseElement, Executable
 from sqlalchemy.ext.compiler import compiles
@@ -47,6 +69,13 @@ from threatexchange.exchanges.fetch_state import (
 
 from threatexchange.storage.interfaces import SignalTypeConfig
 
+# The first key of our postgres advisory locks, the second is per object
+INDEX_BUILD_LOCK_NAMESPACE = 0x4F4D4D49
+# Notified with the signal type and checkpoint when an index is stored
+INDEX_UPDATE_CHANNEL = "omm_signal_index"
+# Transactions before this one have all committed or rolled back
+SETTLED_TXID = text("pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+
 
 class DefaultOMMStore(interface.IUnifiedStore):
     """
@@ -170,7 +199,7 @@ class DefaultOMMStore(interface.IUnifiedStore):
                 SignalTypeOverride.name == signal_type
             )
         ).scalar_one_or_none()
-        
+
         if db_record is not None:
             db_record.enabled_ratio = enabled_ratio
         else:
@@ -226,8 +255,29 @@ class DefaultOMMStore(interface.IUnifiedStore):
             session.add(db_record)
 
         db_record.commit_signal_index(index, checkpoint)
+        # Delivered to listeners when (and only if) the new index commits
+        session.execute(
+            select(
+                func.pg_notify(
+                    INDEX_UPDATE_CHANNEL,
+                    json.dumps(
+                        {
+                            "signal_type": signal_type.get_name(),
+                            "checkpoint": dataclasses.asdict(checkpoint),
+                        }
+                    ),
+                )
+            )
+        )
         session.commit()
 
+    def index_updates(
+        self, timeout: float
+    ) -> t.Optional[
+        t.Iterator[t.Optional[t.Tuple[str, interface.SignalTypeIndexBuildCheckpoint]]]
+    ]:
+        return _listen_index_updates(timeout)
+
     def get_last_index_build_checkpoint(
         self, signal_type: t.Type[SignalType]
     ) -> t.Optional[interface.SignalTypeIndexBuildCheckpoint]:
@@ -243,6 +293,64 @@ class DefaultOMMStore(interface.IUnifiedStore):
         return db_record.as_checkpoint()
 
     # Collabs
+
+    def index_build_lock(
+        self, signal_type: t.Type[SignalType]
+    ) -> t.ContextManager[bool]:
+        return _advisory_lock(INDEX_BUILD_LOCK_NAMESPACE, signal_type.get_name())
+
+    def get_index_build_status(
+        self, signal_type: t.Type[SignalType]
+    ) -> interface.SignalTypeIndexBuildStatus:
+        session = create_session()
+        status = session.get(SignalIndexBuildStatus, signal_type.get_name())
+        if status is None:
+            return interface.SignalTypeIndexBuildStatus.get_default()
+        return status.as_storage_iface_cls()
+
+    def index_build_start(
+        self, signal_type: t.Type[SignalType], node: str, signals_target: int
+    ) -> None:
+        self._upsert_index_build_status(
+            signal_type,
+            running_build_node=node,
+            running_build_start_ts=int(time.time()),
+            signals_added=0,
+            signals_target=signals_target,
+        )
+
+    def index_build_progress(
+        self, signal_type: t.Type[SignalType], signals_added: int
+    ) -> None:
+        self._upsert_index_build_status(signal_type, signals_added=signals_added)
+
+    def index_build_complete(
+        self, signal_type: t.Type[SignalType], succeeded: bool
+    ) -> None:
+        self._upsert_index_build_status(
+            signal_type,
+            running_build_node=None,
+            running_build_start_ts=None,
+            last_build_complete_ts=int(time.time()),
+            last_build_succeeded=succeeded,
+        )
+
+    def _upsert_index_build_status(
+        self, signal_type: t.Type[SignalType], **values: t.Any
+    ) -> None:
+        # Over its own connection, as the build's session is usually in
+        # the middle of streaming content
+        statement = pg_insert(SignalIndexBuildStatus).values(
+            signal_type=signal_type.get_name(), **values
+        )
+        with engine.begin() as conn:
+            conn.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[SignalIndexBuildStatus.signal_type],
+                    set_=values,
+                )
+            )
+
     def exchange_update(
         self, cfg: CollaborationConfigBase, *, create: bool = False
     ) -> None:
@@ -456,7 +564,11 @@ class DefaultOMMStore(interface.IUnifiedStore):
                         }
                     )
 
-        if xd_to_create:
+        if len(xd_to_create) >= settings.exchange_copy_min_records:
+            # Everything about a new record is new, so it can all be loaded
+            # in bulk, leaving the passes below just the existing records
+            _copy_create_exchange_data(cfg.id, cfg.import_bank.id, xd_to_create)
+        elif xd_to_create:
             created_ids = session.scalars(
                 insert(ExchangeData).returning(
                     ExchangeData.id, sort_by_parameter_order=True
@@ -517,6 +629,13 @@ class DefaultOMMStore(interface.IUnifiedStore):
             for b in session.execute(select(Bank)).scalars().all()
         }
 
+    def get_banks_by_id(self) -> t.Mapping[int, interface.BankConfig]:
+        session = create_session()
+        return {
+            b.id: b.as_storage_iface_cls()
+            for b in session.execute(select(Bank)).scalars().all()
+        }
+
     def get_bank(self, name: str) -> t.Optional[interface.BankConfig]:
         """Override for more efficient lookup."""
         session = create_session()
@@ -565,8 +684,9 @@ class DefaultOMMStore(interface.IUnifiedStore):
         return [
             bank_content.as_storage_iface_cls()
             for bank_content in session.query(BankContent)
-              .filter(BankContent.id.in_(ids))
-              .all()
+            .options(joinedload(BankContent.bank))
+            .filter(BankContent.id.in_(ids))
+            .all()
         ]
 
     def bank_content_update(self, val: interface.BankContentConfig) -> None:
@@ -579,6 +699,84 @@ class DefaultOMMStore(interface.IUnifiedStore):
         bank_content.set_typed_config(val)
         session.commit()
 
+    def bank_export_content(
+        self,
+        signal_type: t.Type[SignalType],
+        upto: interface.SignalTypeIndexBuildCheckpoint,
+        batch_size: int = 10_000,
+    ) -> t.Iterator[interface.BankContentColumns]:
+        if upto.total_hash_count == 0:
+            return iter(())
+        # As in bank_yield_content_since(), the exact create_time to stop at
+        last_create_time = (
+            create_session()
+            .execute(
+                select(ContentSignal.create_time)
+                .where(ContentSignal.signal_type == signal_type.get_name())
+                .where(ContentSignal.content_id == upto.last_item_id)
+            )
+            .scalar_one_or_none()
+        )
+        # If the target was removed since, read everything: the checkpoint
+        # won't match, so the next build starts from scratch anyway
+        return export_signals(
+            signal_type.get_name(),
+            None if last_create_time is None else (last_create_time, upto.last_item_id),
+            batch_size,
+        )
+
+    def bank_content_get_changes(
+        self, after: t.Tuple[int, int] = (0, 0), limit: int = 10_000
+    ) -> t.Sequence[interface.BankContentChangeItem]:
+        # Ids are taken before commit, so a change can become visible after
+        # one with a higher id has been read. Instead, only return changes
+        # from transactions older than any still running (which are all
+        # visible, and stay that way), in order of transaction. Any change
+        # that becomes visible later has a newer transaction than these.
+        session = create_session()
+        return [
+            change.as_storage_iface_cls()
+            for change in session.execute(
+                select(BankContentChange)
+                .where(
+                    tuple_(BankContentChange.txid, BankContentChange.id)
+                    > tuple_(literal(after[0]), literal(after[1]))
+                )
+                .where(BankContentChange.txid < SETTLED_TXID)
+                .order_by(BankContentChange.txid, BankContentChange.id)
+                .limit(limit)
+            ).scalars()
+        ]
+
+    def bank_content_get_changes_start(self) -> t.Tuple[int, int]:
+        # Changes from before this have all committed
+        return create_session().execute(select(SETTLED_TXID)).scalar_one(), 0
+
+    def bank_content_get_metadata(
+        self, after_id: int = 0, limit: int = 10_000
+    ) -> t.Sequence[interface.BankContentMetadataItem]:
+        session = create_session()
+        return [
+            interface.BankContentMetadataItem(id, bank_id, disable_until_ts)
+            for id, bank_id, disable_until_ts in session.execute(
+                select(
+                    BankContent.id, BankContent.bank_id, BankContent.disable_until_ts
+                )
+                .where(BankContent.id > after_id)
+                .order_by(BankContent.id)
+                .limit(limit)
+            ).tuples()
+        ]
+
+    def bank_content_prune_changes(self, before_ts: int) -> None:
+        session = create_session()
+        session.execute(
+            delete(BankContentChange).where(
+                BankContentChange.create_time < func.to_timestamp(before_ts)
+            )
+        )
+        session.commit()
+
     def bank_add_content(
         self,
         bank_name: str,
@@ -622,9 +820,15 @@ class DefaultOMMStore(interface.IUnifiedStore):
             ContentSignal.signal_type == signal_type.get_name()
         )
         statement = t.cast(Select[ContentSignal], query.statement)
-        count = query.session.execute(
-            statement.with_only_columns(func.count()).order_by(None)
-        ).scalar()
+        count, content_id_sum = (
+            query.session.execute(
+                statement.with_only_columns(
+                    func.count(), func.coalesce(func.sum(ContentSignal.content_id), 0)
+                ).order_by(None)
+            )
+            .one()
+            ._tuple()
+        )
 
         if not count:
             return interface.SignalTypeIndexBuildCheckpoint.get_empty()
@@ -648,6 +852,7 @@ class DefaultOMMStore(interface.IUnifiedStore):
             last_item_id=content_id,
             last_item_timestamp=int(create_datetime.timestamp()),
             total_hash_count=count,
+            content_id_sum=int(content_id_sum),
         )
 
     def bank_yield_content(
@@ -684,6 +889,201 @@ class DefaultOMMStore(interface.IUnifiedStore):
             for row in partition:
                 yield row._tuple()[0].as_iteration_item()
 
+    def bank_yield_content_since(
+        self,
+        signal_type: t.Type[SignalType],
+        checkpoint: interface.SignalTypeIndexBuildCheckpoint,
+        batch_size: int = 100,
+    ) -> t.Optional[t.Iterator[interface.BankContentIterationItem]]:
+        if checkpoint.total_hash_count == 0:
+            return self.bank_yield_content(signal_type, batch_size)
+        if checkpoint.content_id_sum is None:
+            # Built before we kept it, so we can't check the index's content
+            return None
+
+        session = create_session()
+        # The checkpoint's timestamp is truncated to the second, so find the
+        # exact create_time of its last item to resume from. If it's gone,
+        # content was removed, and we can't tell what else was.
+        last_create_time = session.execute(
+            select(ContentSignal.create_time)
+            .where(ContentSignal.signal_type == signal_type.get_name())
+            .where(ContentSignal.content_id == checkpoint.last_item_id)
+        ).scalar_one_or_none()
+        if last_create_time is None:
+            return None
+
+        after_checkpoint = tuple_(
+            ContentSignal.create_time, ContentSignal.content_id
+        ) > tuple_(literal(last_create_time), literal(checkpoint.last_item_id))
+
+        # create_time is when the transaction began, so content can commit
+        # behind the checkpoint after it was taken. Counting alone, one such
+        # row and one removal would look like no change, so the ids of the
+        # content before the checkpoint must also add up to what was indexed.
+        # All come from the same statement, so see the same rows.
+        total, added, before_id_sum = (
+            session.execute(
+                select(
+                    func.count(),
+                    func.count().filter(after_checkpoint),
+                    func.coalesce(
+                        func.sum(ContentSignal.content_id).filter(~after_checkpoint), 0
+                    ),
+                ).where(ContentSignal.signal_type == signal_type.get_name())
+            )
+            .one()
+            ._tuple()
+        )
+        if (
+            total - added != checkpoint.total_hash_count
+            or before_id_sum != checkpoint.content_id_sum
+        ):
+            return None
+
+        query = (
+            select(ContentSignal)
+            .where(ContentSignal.signal_type == signal_type.get_name())
+            .where(after_checkpoint)
+            .order_by(ContentSignal.create_time, ContentSignal.content_id)
+            .execution_options(stream_results=True, max_row_buffer=batch_size)
+        )
+        return (
+            row.as_iteration_item()
+            for row in session.execute(query).scalars().yield_per(batch_size)
+        )
+
+
+@contextlib.contextmanager
+def _advisory_lock(namespace: int, name: str) -> t.Iterator[bool]:
+    """
+    Try to take a postgres advisory lock, held until the block exits.
+
+    The lock is held by a connection of its own, so if this process dies,
+    postgres releases it as soon as the connection drops.
+    """
+    with engine.connect() as conn:
+        key = (namespace, func.hashtext(name))
+        locked = conn.execute(select(func.pg_try_advisory_lock(*key))).scalar_one()
+        # Session level advisory locks outlive the transaction
+        conn.commit()
+        try:
+            yield locked
+        finally:
+            if locked:
+                conn.execute(select(func.pg_advisory_unlock(*key)))
+                conn.commit()
+
+
+def _listen_index_updates(
+    timeout: float,
+) -> t.Iterator[t.Optional[t.Tuple[str, interface.SignalTypeIndexBuildCheckpoint]]]:
+    """LISTEN for index updates, on a connection held for as long as we do"""
+    raw_conn = engine.raw_connection()
+    try:
+        conn = raw_conn.driver_connection
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {INDEX_UPDATE_CHANNEL}")
+        while True:
+            if select_module.select([conn], [], [], timeout) == ([], [], []):
+                yield None
+                continue
+            conn.poll()
+            while conn.notifies:
+                payload = json.loads(conn.notifies.pop(0).payload)
+                yield payload["signal_type"], interface.SignalTypeIndexBuildCheckpoint(
+                    **payload["checkpoint"]
+                )
+    finally:
+        # Don't hand a listening connection back to the pool
+        raw_conn.invalidate()
+
+
+def _copy_create_exchange_data(
+    collab_id: int,
+    bank_id: int,
+    to_create: t.Sequence[t.Tuple[dict[str, t.Any], "_BulkDbOpExchangeDataHelper"]],
+) -> None:
+    """
+    Bulk pass: create new exchange data, with its content and signals.
+
+    The records and their signals are COPYed into temp tables, and then
+    inserted into the real ones by a single statement, which is much faster
+    than inserting them row by row for a large fetch.
+    """
+    session = create_session()
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.execute("""
+            CREATE TEMP TABLE omm_stage_exchange_data (
+                seq bigint, fetch_id text, pickled_fetch_signal_metadata bytea
+            ) ON COMMIT DROP;
+            CREATE TEMP TABLE omm_stage_content_signal (
+                seq bigint, signal_type text, signal_val text
+            ) ON COMMIT DROP;
+            """)
+        copy_rows(
+            cursor,
+            "omm_stage_exchange_data",
+            [
+                ("seq", "bigint"),
+                ("fetch_id", "text"),
+                ("pickled_fetch_signal_metadata", "bytea"),
+            ],
+            (
+                (seq, xd["fetch_id"], xd["pickled_fetch_signal_metadata"])
+                for seq, (xd, _) in enumerate(to_create)
+            ),
+        )
+        copy_rows(
+            cursor,
+            "omm_stage_content_signal",
+            [("seq", "bigint"), ("signal_type", "text"), ("signal_val", "text")],
+            (
+                (seq, signal_type.get_name(), signal_val)
+                for seq, (_, op) in enumerate(to_create)
+                for signal_type, signals in op.update_as_signals.items()
+                for signal_val in signals
+            ),
+        )
+    finally:
+        cursor.close()
+
+    # Columns with python-side defaults have to be given here
+    session.execute(
+        text("""
+            WITH xd AS (
+                INSERT INTO exchange_data (
+                    collab_id,
+                    fetch_id,
+                    pickled_fetch_signal_metadata,
+                    fetched_metadata_summary,
+                    matched
+                )
+                SELECT :collab_id, fetch_id, pickled_fetch_signal_metadata, '[]', false
+                FROM omm_stage_exchange_data
+                RETURNING id, fetch_id
+            ), bc AS (
+                INSERT INTO bank_content (bank_id, imported_from_id, disable_until_ts)
+                SELECT :bank_id, id, :enabled FROM xd
+                RETURNING id, imported_from_id
+            )
+            INSERT INTO content_signal (content_id, signal_type, signal_val)
+            SELECT bc.id, s.signal_type, s.signal_val
+            FROM omm_stage_content_signal s
+            JOIN omm_stage_exchange_data d USING (seq)
+            JOIN xd ON xd.fetch_id = d.fetch_id
+            JOIN bc ON bc.imported_from_id = xd.id
+            """),
+        {
+            "collab_id": collab_id,
+            "bank_id": bank_id,
+            "enabled": interface.BankContentConfig.ENABLED,
+        },
+    )
+
+
 def _sync_bankable_content(
     # ops is modified during the course of the function
     ops: dict[int, "_BulkDbOpExchangeDataHelper"],
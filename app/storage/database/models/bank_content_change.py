@@ -0,0 +1,41 @@
+import datetime
+
+from sqlalchemy import BigInteger, DateTime, func, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.storage.interface import BankContentChangeItem
+from app.storage.database.base_model import BaseModel
+
+
+class BankContentChange(BaseModel):  # type: ignore[name-defined]
+    """
+    A log of bank content being removed, disabled or re-enabled.
+
+    Rows are written by triggers on bank_content (see migration 2 in
+    app/storage/database/schema.py), so every path that
+    changes content (including cascading deletes of a bank or exchange) is
+    captured. Matchers poll it to stop matching content straight away,
+    rather than waiting for the index to be rebuilt.
+    """
+
+    __tablename__ = "bank_content_change"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    content_id: Mapped[int]
+    # None if the content was removed
+    disable_until_ts: Mapped[int | None]
+    create_time: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
+    # The transaction that made the change, see bank_content_get_changes()
+    txid: Mapped[int] = mapped_column(
+        BigInteger, server_default=text("pg_current_xact_id()::text::bigint")
+    )
+
+    def as_storage_iface_cls(self) -> BankContentChangeItem:
+        return BankContentChangeItem(
+            id=self.id,
+            bank_content_id=self.content_id,
+            disable_until_ts=self.disable_until_ts,
+            txid=self.txid,
+        )
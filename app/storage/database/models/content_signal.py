@@ -1,19 +1,37 @@
+import queue
+import threading
 import typing as t
 import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Index, Text, func
+import numpy as np
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    ForeignKey,
+    Index,
+    Text,
+    cast,
+    func,
+    literal,
+    select,
+    tuple_,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from app.storage.interface import BankContentIterationItem
+from app.settings import settings
+from app.storage.interface import BankContentColumns, BankContentIterationItem
 from app.storage.database.base_model import BaseModel
+from app.storage.database.connection import engine
 
 if t.TYPE_CHECKING:
     from app.storage.database.models.bank_content import BankContent
 
+
 class ContentSignal(BaseModel):  # type: ignore[name-defined]
     """
     The signals for a single piece of labeled content.
     """
+
     __tablename__ = "content_signal"
 
     content_id: Mapped[int] = mapped_column(
@@ -43,3 +61,106 @@ class ContentSignal(BaseModel):  # type: ignore[name-defined]
             bank_content_id=self.content_id,
             bank_content_timestamp=int(self.create_time.timestamp()),
         )
+
+
+def export_signals(
+    signal_type: str,
+    upto: t.Optional[t.Tuple[datetime.datetime, int]],
+    batch_size: int,
+) -> t.Iterator[BankContentColumns]:
+    """
+    Stream every signal of a type as column batches, in no particular order.
+
+    The content_id range is split into settings.index_export_parallelism
+    ranges, each scanned on its own connection and thread, selecting just
+    the columns rather than ORM objects. If upto is a (create_time,
+    content_id), only signals at or before it are read.
+    """
+    with engine.connect() as conn:
+        lo, hi = (
+            conn.execute(
+                select(
+                    func.min(ContentSignal.content_id),
+                    func.max(ContentSignal.content_id),
+                ).where(ContentSignal.signal_type == signal_type)
+            )
+            .one()
+            ._tuple()
+        )
+    if lo is None:
+        return
+    step = -(-(hi - lo + 1) // settings.index_export_parallelism)
+    ranges = [(start, min(start + step, hi + 1)) for start in range(lo, hi + 1, step)]
+
+    # Bounded, so a slow consumer doesn't buffer the whole bank
+    batches: queue.Queue[t.Union[BankContentColumns, BaseException, None]] = (
+        queue.Queue(maxsize=2 * len(ranges))
+    )
+    stop = threading.Event()
+
+    def put(item: t.Union[BankContentColumns, BaseException, None]) -> bool:
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def scan(start: int, end: int) -> None:
+        query = select(
+            ContentSignal.content_id,
+            ContentSignal.signal_val,
+            cast(
+                func.floor(func.extract("epoch", ContentSignal.create_time)), BigInteger
+            ),
+        ).where(
+            ContentSignal.signal_type == signal_type,
+            ContentSignal.content_id >= start,
+            ContentSignal.content_id < end,
+        )
+        if upto is not None:
+            query = query.where(
+                tuple_(ContentSignal.create_time, ContentSignal.content_id)
+                <= tuple_(
+                    literal(upto[0], ContentSignal.create_time.type), literal(upto[1])
+                )
+            )
+        try:
+            with engine.connect() as conn:
+                result = conn.execution_options(
+                    stream_results=True, max_row_buffer=batch_size
+                ).execute(query)
+                for rows in result.partitions(batch_size):
+                    ids, vals, timestamps = zip(*rows)
+                    columns = BankContentColumns(
+                        list(vals),
+                        np.array(ids, dtype=np.int64),
+                        np.array(timestamps, dtype=np.int64),
+                    )
+                    if not put(columns):
+                        return
+            put(None)
+        except BaseException as e:
+            put(e)
+
+    threads = [
+        threading.Thread(target=scan, args=r, name=f"export-{signal_type}-{r[0]}")
+        for r in ranges
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        remaining = len(threads)
+        while remaining:
+            item = batches.get()
+            if item is None:
+                remaining -= 1
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -1,4 +1,3 @@
-import io
 import logging
 import os
 import time
@@ -6,12 +5,20 @@ import typing as t
 import datetime
 import tempfile
 
-from sqlalchemy import BigInteger, DateTime, String, event, func, text
+from sqlalchemy import BigInteger, DateTime, String, delete, event, func, select, text
 from sqlalchemy.dialects.postgresql import OID
 from sqlalchemy.orm import Mapped, mapped_column
 
+from app.settings import settings
+from app.storage import index_format
+from app.storage.index_snapshots import get_index_snapshots
 from app.storage.database.base_model import BaseModel
 from app.storage.database.connection import create_session, engine
+from app.storage.database.models.signal_index_chunk import (
+    SignalIndexChunk,
+    read_chunks,
+    write_chunks,
+)
 from app.storage.interface import SignalTypeIndex, SignalTypeIndexBuildCheckpoint
 from app.utils.time_utils import duration_to_human_str
 
@@ -32,15 +39,32 @@ class SignalIndex(BaseModel):  # type: ignore[name-defined]
 
     serialized_index_large_object_oid: Mapped[int | None] = mapped_column(OID)
 
+    # The manifest of an index stored as SignalIndexChunks instead
+    chunk_generation: Mapped[int | None]
+    chunk_count: Mapped[int | None]
+    chunk_size: Mapped[int | None]
+    raw_size: Mapped[int | None] = mapped_column(BigInteger)
+    content_id_sum: Mapped[int | None] = mapped_column(BigInteger)
+
     def index_lobj_exists(self) -> bool:
         """
-        Return true if the index lobj exists and load_signal_index should work.
+        Return true if the index data exists and load_signal_index should work.
 
         In normal operation, this should always return true. However,
         we've observed in github.com/facebook/ThreatExchange/issues/1673
         that some partial failure is possible. This can be used to
         detect that condition.
         """
+        if self.chunk_generation is not None:
+            chunks = create_session().execute(
+                select(func.count()).where(
+                    SignalIndexChunk.signal_index_id == self.id,
+                    SignalIndexChunk.generation == self.chunk_generation,
+                )
+            ).scalar_one()
+            return chunks == self.chunk_count
+        if self.serialized_index_large_object_oid is None:
+            return False
         count = create_session().execute(
             text(
                 "SELECT count(1) FROM pg_largeobject_metadata "
@@ -55,6 +79,7 @@ class SignalIndex(BaseModel):  # type: ignore[name-defined]
         self.updated_to_id = checkpoint.last_item_id
         self.updated_to_ts = checkpoint.last_item_timestamp
         self.signal_count = checkpoint.total_hash_count
+        self.content_id_sum = checkpoint.content_id_sum
 
         serialize_start_time = time.time()
         with tempfile.NamedTemporaryFile("wb", delete=False) as tmpfile:
@@ -68,10 +93,71 @@ class SignalIndex(BaseModel):  # type: ignore[name-defined]
             duration_to_human_str(int(time.time() - serialize_start_time)),
         )
 
+        if settings.index_storage == "chunked":
+            self._store_chunks(tmpfile.name, size)
+        else:
+            self._store_lobj(tmpfile.name)
+
+        try:
+            os.unlink(tmpfile.name)
+        except Exception:
+            self._log(
+                "failed to clean up tmpfile %s!", tmpfile.name, level=logging.ERROR
+            )
+        self._log("cleaned up tmpfile")
+
+        return self
+
+    def _store_chunks(self, path: str, size: int) -> None:
+        store_start_time = time.time()
+        session = create_session()
+        if self.id is None:
+            # The chunks are written over other connections, which need to
+            # see this row. Until there are chunks, it has no index.
+            session.add(self)
+            session.commit()
+
+        generation = (self.chunk_generation or 0) + 1
+        chunk_size = settings.index_chunk_size
+        count, stored = write_chunks(self.id, generation, path, chunk_size)
+        self._log(
+            "stored %d bytes as %d chunks (generation %d) - %s",
+            stored,
+            count,
+            generation,
+            duration_to_human_str(int(time.time() - store_start_time)),
+        )
+
+        # Everything below commits with the new manifest, atomically
+        if self.serialized_index_large_object_oid is not None:
+            if self.index_lobj_exists():
+                self._log(
+                    "deallocating old lobject %d",
+                    self.serialized_index_large_object_oid,
+                )
+                session.execute(
+                    select(func.lo_unlink(self.serialized_index_large_object_oid))
+                )
+            self.serialized_index_large_object_oid = None
+        # Keep the previous generation, for matchers that read its manifest
+        # and are still reading its chunks
+        session.execute(
+            delete(SignalIndexChunk).where(
+                SignalIndexChunk.signal_index_id == self.id,
+                SignalIndexChunk.generation < generation - 1,
+            )
+        )
+        self.chunk_generation = generation
+        self.chunk_count = count
+        self.chunk_size = chunk_size
+        self.raw_size = size
+        session.add(self)
+
+    def _store_lobj(self, path: str) -> None:
         store_start_time = time.time()
         # Deep dark magic - direct access postgres large object API
         raw_conn = engine.raw_connection()
-        l_obj = raw_conn.lobject(0, "wb", 0, tmpfile.name)  # type: ignore[attr-defined]
+        l_obj = raw_conn.lobject(0, "wb", 0, path)  # type: ignore[attr-defined]
         self._log(
             "imported tmpfile as lobject oid %d - %s",
             l_obj.oid,
@@ -90,51 +176,88 @@ class SignalIndex(BaseModel):  # type: ignore[name-defined]
                 )
 
         self.serialized_index_large_object_oid = l_obj.oid
+        if self.chunk_generation is not None:
+            create_session().execute(
+                delete(SignalIndexChunk).where(
+                    SignalIndexChunk.signal_index_id == self.id
+                )
+            )
+            self.chunk_generation = None
         create_session().add(self)
         raw_conn.commit()
 
-        try:
-            os.unlink(tmpfile.name)
-        except Exception:
-            self._log(
-                "failed to clean up tmpfile %s!", tmpfile.name, level=logging.ERROR
-            )
-        self._log("cleaned up tmpfile")
-
-        return self
-
     def load_signal_index(self) -> SignalTypeIndex[int]:
-        oid = self.serialized_index_large_object_oid
-        assert oid is not None
         # If we were being fully proper, we would get the SignalType
         # class and use that index to compare them. However, every existing
-        # index as of 10/2/2023 is using pickle, which will produce the right
-        # class no matter which interface we call it on.
+        # index is either flat (which names its class in the header) or
+        # pickle, which will produce the right class no matter which
+        # interface we call it on.
         # I'm sorry future debugger finding this comment.
-        load_start_time = time.time()
-        raw_conn = engine.raw_connection()
-        l_obj = raw_conn.lobject(oid, "rb")  # type: ignore[attr-defined]
+        snapshots = get_index_snapshots()
+        if snapshots is None:
+            with tempfile.NamedTemporaryFile("rb") as tmpfile:
+                self._export(tmpfile.name)
+                # A flat index is memory mapped rather than read, and the
+                # mapping outlives the tmpfile being deleted
+                return self._deserialize(t.cast(t.BinaryIO, tmpfile))
 
-        with tempfile.NamedTemporaryFile("rb") as tmpfile:
-            self._log("importing lobject oid %d to tmpfile %s", l_obj.oid, tmpfile.name)
-            l_obj.export(tmpfile.name)
-            tmpfile.seek(0, io.SEEK_END)
-            self._log(
-                "loaded %d bytes to tmpfile - %s",
-                tmpfile.tell(),
-                duration_to_human_str(int(time.time() - load_start_time)),
-            )
-            tmpfile.seek(0)
+        if self.chunk_generation is not None:
+            source = f"chunks{self.chunk_generation}"
+        else:
+            source = f"lo{self.serialized_index_large_object_oid}"
+        key = snapshots.key(self.signal_type, source, self.updated_to_ts)
+        path = snapshots.get(key)
+        if path is None:
+            path = snapshots.put(key, self._export)
+        else:
+            self._log("using local snapshot %s", path)
+        with path.open("rb") as fin:
+            return self._deserialize(fin)
 
-            deserialize_start = time.time()
-            index = t.cast(
-                SignalTypeIndex[int],
-                SignalTypeIndex.deserialize(t.cast(t.BinaryIO, tmpfile.file)),
+    def _export(self, dest: str) -> None:
+        load_start_time = time.time()
+        if self.chunk_generation is not None:
+            assert self.chunk_count is not None and self.chunk_size is not None
+            assert self.raw_size is not None
+            read_chunks(
+                self.id,
+                self.chunk_generation,
+                self.chunk_count,
+                self.chunk_size,
+                self.raw_size,
+                dest,
             )
             self._log(
-                "deserialized - %s",
-                duration_to_human_str(int(time.time() - deserialize_start)),
+                "read %d chunks to %s - %s",
+                self.chunk_count,
+                dest,
+                duration_to_human_str(int(time.time() - load_start_time)),
             )
+            return
+
+        oid = self.serialized_index_large_object_oid
+        assert oid is not None
+        raw_conn = engine.raw_connection()
+        try:
+            l_obj = raw_conn.lobject(oid, "rb")  # type: ignore[attr-defined]
+            self._log("exporting lobject oid %d to %s", l_obj.oid, dest)
+            l_obj.export(dest)
+        finally:
+            raw_conn.close()
+        self._log(
+            "loaded %d bytes to %s - %s",
+            os.path.getsize(dest),
+            dest,
+            duration_to_human_str(int(time.time() - load_start_time)),
+        )
+
+    def _deserialize(self, fin: t.BinaryIO) -> SignalTypeIndex[int]:
+        deserialize_start = time.time()
+        index = index_format.load_index(fin)
+        self._log(
+            "deserialized - %s",
+            duration_to_human_str(int(time.time() - deserialize_start)),
+        )
         return index
 
     def as_checkpoint(self) -> SignalTypeIndexBuildCheckpoint:
@@ -142,6 +265,7 @@ class SignalIndex(BaseModel):  # type: ignore[name-defined]
             last_item_id=self.updated_to_id,
             last_item_timestamp=self.updated_to_ts,
             total_hash_count=self.signal_count,
+            content_id_sum=self.content_id_sum,
         )
 
     def _log(self, msg: str, *args: t.Any, level: int = logging.DEBUG) -> None:
@@ -153,6 +277,8 @@ def _remove_large_object_after_delete(_, connection, signal_index: SignalIndex)
     """
     Hopefully we don't need to rely on this, but attempt to prevent orphaned large objects.
     """
+    if signal_index.serialized_index_large_object_oid is None:
+        return
     raw_connection = connection.connection
     l_obj = raw_connection.lobject(signal_index.serialized_index_large_object_oid, "n")
     l_obj.unlink()
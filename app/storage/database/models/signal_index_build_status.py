@@ -0,0 +1,36 @@
+import typing as t
+
+from sqlalchemy import BigInteger, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.storage.database.base_model import BaseModel
+from app.storage.interface import SignalTypeIndexBuildStatus
+
+
+class SignalIndexBuildStatus(BaseModel):  # type: ignore[name-defined]
+    """
+    Who is building each signal type's index, and how far they've got.
+
+    Kept apart from SignalIndex, as it's written (over its own connection)
+    while a build is streaming content, long before there's an index.
+    """
+
+    __tablename__ = "signal_index_build_status"
+
+    signal_type: Mapped[str] = mapped_column(String(255), primary_key=True)
+    running_build_node: Mapped[t.Optional[str]] = mapped_column(String(255))
+    running_build_start_ts: Mapped[t.Optional[int]] = mapped_column(BigInteger)
+    signals_added: Mapped[int] = mapped_column(BigInteger, default=0)
+    signals_target: Mapped[int] = mapped_column(BigInteger, default=0)
+    last_build_complete_ts: Mapped[t.Optional[int]] = mapped_column(BigInteger)
+    last_build_succeeded: Mapped[t.Optional[bool]]
+
+    def as_storage_iface_cls(self) -> SignalTypeIndexBuildStatus:
+        return SignalTypeIndexBuildStatus(
+            running_build_node=self.running_build_node,
+            running_build_start_ts=self.running_build_start_ts,
+            signals_added=self.signals_added,
+            signals_target=self.signals_target,
+            last_build_complete_ts=self.last_build_complete_ts,
+            last_build_succeeded=self.last_build_succeeded,
+        )
@@ -0,0 +1,143 @@
+import concurrent.futures
+import mmap
+import os
+import typing as t
+
+from sqlalchemy import (
+    BigInteger,
+    ForeignKey,
+    LargeBinary,
+    UniqueConstraint,
+    delete,
+    insert,
+    select,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+import zstandard
+
+from app.settings import settings
+from app.storage.database.base_model import BaseModel
+from app.storage.database.connection import engine
+
+
+class SignalIndexChunk(BaseModel):  # type: ignore[name-defined]
+    """
+    One zstd compressed, fixed size chunk of a serialized index.
+
+    The chunks of an index are written and read in parallel, each over its
+    own pooled connection. SignalIndex holds the manifest (which generation
+    is current, and how many chunks it has), so a new generation can be
+    written alongside the current one, and swapped in by updating it. The
+    generation before the current one is kept until the next swap, so a
+    reader that read the previous manifest can finish reading its chunks.
+    """
+
+    __tablename__ = "signal_index_chunk"
+    __table_args__ = (UniqueConstraint("signal_index_id", "generation", "seq"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    signal_index_id: Mapped[int] = mapped_column(
+        ForeignKey("signal_index.id", ondelete="CASCADE"), index=True
+    )
+    generation: Mapped[int]
+    seq: Mapped[int]
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+def write_chunks(
+    signal_index_id: int, generation: int, src: str, chunk_size: int
+) -> t.Tuple[int, int]:
+    """
+    Compress and store a serialized index file as chunks.
+
+    Returns the number of chunks, and the bytes stored. Chunks are committed
+    one by one, so any left of this generation by an earlier attempt that
+    failed partway are removed first, and ours are removed if we fail.
+    """
+    _delete_generation(signal_index_id, generation)
+    size = os.path.getsize(src)
+    count = max(1, -(-size // chunk_size))
+    fd = os.open(src, os.O_RDONLY)
+
+    def write(seq: int) -> int:
+        raw = os.pread(fd, chunk_size, seq * chunk_size)
+        # zstd releases the GIL, so chunks compress in parallel too
+        data = zstandard.ZstdCompressor(
+            level=settings.index_chunk_compression_level
+        ).compress(raw)
+        with engine.begin() as conn:
+            conn.execute(
+                insert(SignalIndexChunk).values(
+                    signal_index_id=signal_index_id,
+                    generation=generation,
+                    seq=seq,
+                    data=data,
+                )
+            )
+        return len(data)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(
+            settings.index_chunk_parallelism
+        ) as pool:
+            stored = sum(pool.map(write, range(count)))
+    except BaseException:
+        _delete_generation(signal_index_id, generation)
+        raise
+    finally:
+        os.close(fd)
+    return count, stored
+
+
+def _delete_generation(signal_index_id: int, generation: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            delete(SignalIndexChunk).where(
+                SignalIndexChunk.signal_index_id == signal_index_id,
+                SignalIndexChunk.generation == generation,
+            )
+        )
+
+
+def read_chunks(
+    signal_index_id: int,
+    generation: int,
+    count: int,
+    chunk_size: int,
+    raw_size: int,
+    dest: str,
+) -> None:
+    """
+    Read a chunked index into the file dest.
+
+    Each chunk is decompressed straight into its place in a mapping of
+    dest, rather than buffered and written out.
+    """
+    with open(dest, "wb+") as f:
+        f.truncate(raw_size)
+        with mmap.mmap(f.fileno(), raw_size) as mm:
+
+            def read(seq: int) -> None:
+                with engine.connect() as conn:
+                    data = conn.execute(
+                        select(SignalIndexChunk.data).where(
+                            SignalIndexChunk.signal_index_id == signal_index_id,
+                            SignalIndexChunk.generation == generation,
+                            SignalIndexChunk.seq == seq,
+                        )
+                    ).scalar_one()
+                start = seq * chunk_size
+                with memoryview(mm)[start : min(start + chunk_size, raw_size)] as view:
+                    with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+                        pos = 0
+                        while pos < len(view):
+                            n = reader.readinto(view[pos:])
+                            if not n:
+                                raise ValueError(f"Index chunk {seq} is truncated")
+                            pos += n
+
+            with concurrent.futures.ThreadPoolExecutor(
+                settings.index_chunk_parallelism
+            ) as pool:
+                # list() to raise any exception
+                list(pool.map(read, range(count)))
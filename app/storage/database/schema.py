@@ -0,0 +1,166 @@
+"""
+The tables and columns OMM adds to the HMA schema, as versioned DDL.
+
+The base schema is HMA's, created by its migrations, so nothing here calls
+create_all(). Each change OMM makes on top is a numbered migration of
+plain, idempotent DDL, applied once and in order, and recorded in
+omm_schema_migration. Migrations are applied under an advisory lock, so
+the workers of a host starting at once don't race, when the app starts
+(unless OMM_DATABASE_MIGRATE is off), before an index build, or from the
+command line:
+
+  python -m app.storage.database.schema
+
+Never edit a migration once it has shipped, add a new one instead.
+"""
+
+import logging
+import typing as t
+
+from sqlalchemy import Engine, text
+
+from app.storage.database.connection import engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+# Key for pg_advisory_xact_lock(), "OMMS"
+SCHEMA_LOCK_KEY = 0x4F4D4D53
+
+MIGRATIONS: t.Sequence[t.Tuple[int, str, str]] = (
+    (
+        1,
+        "signal index chunks",
+        """
+        ALTER TABLE signal_index
+            ADD COLUMN IF NOT EXISTS chunk_generation integer,
+            ADD COLUMN IF NOT EXISTS chunk_count integer,
+            ADD COLUMN IF NOT EXISTS chunk_size integer,
+            ADD COLUMN IF NOT EXISTS raw_size bigint;
+
+        CREATE TABLE IF NOT EXISTS signal_index_chunk (
+            id bigserial PRIMARY KEY,
+            signal_index_id integer NOT NULL
+                REFERENCES signal_index (id) ON DELETE CASCADE,
+            generation integer NOT NULL,
+            seq integer NOT NULL,
+            data bytea NOT NULL,
+            UNIQUE (signal_index_id, generation, seq)
+        );
+        CREATE INDEX IF NOT EXISTS ix_signal_index_chunk_signal_index_id
+            ON signal_index_chunk (signal_index_id);
+        """,
+    ),
+    (
+        2,
+        "bank content change log",
+        # New content is only logged if it starts out disabled, and updates
+        # only if they change disable_until_ts
+        """
+        CREATE TABLE IF NOT EXISTS bank_content_change (
+            id bigserial PRIMARY KEY,
+            content_id integer NOT NULL,
+            disable_until_ts integer,
+            create_time timestamptz NOT NULL DEFAULT now(),
+            txid bigint NOT NULL DEFAULT pg_current_xact_id()::text::bigint
+        );
+        CREATE INDEX IF NOT EXISTS ix_bank_content_change_create_time
+            ON bank_content_change (create_time);
+        CREATE INDEX IF NOT EXISTS ix_bank_content_change_txid_id
+            ON bank_content_change (txid, id);
+
+        CREATE OR REPLACE FUNCTION log_bank_content_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO bank_content_change (content_id, disable_until_ts)
+                VALUES (OLD.id, NULL);
+                RETURN OLD;
+            END IF;
+            INSERT INTO bank_content_change (content_id, disable_until_ts)
+            VALUES (NEW.id, NEW.disable_until_ts);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS bank_content_change_on_insert ON bank_content;
+        CREATE TRIGGER bank_content_change_on_insert
+        AFTER INSERT ON bank_content
+        FOR EACH ROW WHEN (NEW.disable_until_ts <> 1)
+        EXECUTE FUNCTION log_bank_content_change();
+
+        DROP TRIGGER IF EXISTS bank_content_change_on_update ON bank_content;
+        CREATE TRIGGER bank_content_change_on_update
+        AFTER UPDATE OF disable_until_ts ON bank_content
+        FOR EACH ROW WHEN (OLD.disable_until_ts IS DISTINCT FROM NEW.disable_until_ts)
+        EXECUTE FUNCTION log_bank_content_change();
+
+        DROP TRIGGER IF EXISTS bank_content_change_on_delete ON bank_content;
+        CREATE TRIGGER bank_content_change_on_delete
+        AFTER DELETE ON bank_content
+        FOR EACH ROW
+        EXECUTE FUNCTION log_bank_content_change();
+        """,
+    ),
+    (
+        3,
+        "signal index build status",
+        """
+        CREATE TABLE IF NOT EXISTS signal_index_build_status (
+            signal_type varchar(255) PRIMARY KEY,
+            running_build_node varchar(255),
+            running_build_start_ts bigint,
+            signals_added bigint NOT NULL DEFAULT 0,
+            signals_target bigint NOT NULL DEFAULT 0,
+            last_build_complete_ts bigint,
+            last_build_succeeded boolean
+        );
+        """,
+    ),
+    (
+        4,
+        "signal index content id sum",
+        """
+        ALTER TABLE signal_index
+            ADD COLUMN IF NOT EXISTS content_id_sum bigint;
+        """,
+    ),
+)
+
+
+def migrate(engine: Engine = default_engine) -> list[int]:
+    """Apply any migrations not yet applied, returning their versions"""
+    applied = []
+    with engine.begin() as conn:
+        # Held until commit, so a second caller sees what the first applied
+        conn.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY}
+        )
+        conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS omm_schema_migration (
+                    version integer PRIMARY KEY,
+                    description text NOT NULL,
+                    applied_at timestamptz NOT NULL DEFAULT now()
+                )
+                """))
+        done = set(
+            conn.execute(text("SELECT version FROM omm_schema_migration")).scalars()
+        )
+        for version, description, ddl in MIGRATIONS:
+            if version in done:
+                continue
+            logger.info("Applying schema migration %d: %s", version, description)
+            conn.exec_driver_sql(ddl)
+            conn.execute(
+                text(
+                    "INSERT INTO omm_schema_migration (version, description) "
+                    "VALUES (:version, :description)"
+                ),
+                {"version": version, "description": description},
+            )
+            applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    versions = migrate()
+    print(f"Applied {len(versions)} migration(s)" if versions else "Up to date")
@@ -0,0 +1,153 @@
+"""
+A flat binary format for indices, which can be memory mapped.
+
+Pickled indices have to be read and rebuilt in full, which takes a while
+and needs twice the index's size in memory at peak. Indices that are just
+a handful of numpy arrays can instead be written as:
+
+  magic (8 bytes) | version (u32) | header length (u32) | header (json)
+  | array | array | ...
+
+with each array 64 byte aligned, at an offset given in the header
+(relative to the end of the header, itself rounded up to 64 bytes). Loading
+is then an mmap per array, in near constant time, and the pages are
+shared (copy-on-write) with every other process that maps the same file.
+
+Indices opt in by implementing FlatSerializable, and calling write_flat()
+from serialize(). Anything else is still pickled, and load_index() reads
+either.
+"""
+
+import importlib
+import json
+import pickle
+import struct
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+from threatexchange.signal_type.index import SignalTypeIndex
+
+MAGIC = b"OMMFLAT\x00"
+VERSION = 1
+ALIGNMENT = 64
+
+_PREAMBLE = struct.Struct("<8sII")
+
+Self = t.TypeVar("Self", bound="FlatSerializable")
+
+
+class FlatSerializable(t.Protocol):
+    """An index that can be reduced to numpy arrays plus json metadata"""
+
+    def to_arrays(
+        self,
+    ) -> t.Tuple[t.Mapping[str, npt.NDArray[t.Any]], dict[str, t.Any]]: ...
+
+    @classmethod
+    def from_arrays(
+        cls: t.Type[Self],
+        arrays: t.Mapping[str, npt.NDArray[t.Any]],
+        meta: dict[str, t.Any],
+    ) -> Self: ...
+
+
+def write_flat(index: FlatSerializable, fout: t.BinaryIO) -> None:
+    arrays, meta = index.to_arrays()
+    cls = type(index)
+    header: dict[str, t.Any] = {
+        "cls": f"{cls.__module__}:{cls.__qualname__}",
+        "meta": meta,
+        "arrays": [],
+    }
+
+    arrays = {name: np.ascontiguousarray(arr) for name, arr in arrays.items()}
+    offset = 0
+    for name, arr in arrays.items():
+        header["arrays"].append(
+            {
+                "name": name,
+                "dtype": arr.dtype.str,
+                "shape": list(arr.shape),
+                "offset": offset,
+            }
+        )
+        offset = _align(offset + arr.nbytes)
+    encoded = json.dumps(header).encode()
+
+    start = fout.tell()
+    fout.write(_PREAMBLE.pack(MAGIC, VERSION, len(encoded)))
+    fout.write(encoded)
+    data_start = start + _align(_PREAMBLE.size + len(encoded))
+    for entry, arr in zip(header["arrays"], arrays.values()):
+        _pad_to(fout, data_start + entry["offset"])
+        # memoryview avoids a copy of what may be a very large array
+        fout.write(memoryview(arr.reshape(-1)).cast("B"))
+
+
+def is_flat(fin: t.BinaryIO) -> bool:
+    pos = fin.tell()
+    magic = fin.read(len(MAGIC))
+    fin.seek(pos)
+    return magic == MAGIC
+
+
+def read_flat(fin: t.BinaryIO, *, readonly: bool = False) -> t.Any:
+    """
+    Read a flat index, memory mapping the arrays if fin is a file on disk.
+
+    Once mapped, the file can be closed (or even deleted) while the index
+    is in use. If readonly, writing to the arrays raises rather than
+    copying the pages.
+    """
+    start = fin.tell()
+    magic, version, header_len = _PREAMBLE.unpack(fin.read(_PREAMBLE.size))
+    if magic != MAGIC:
+        raise ValueError("Not a flat index")
+    if version != VERSION:
+        raise ValueError(f"Unsupported flat index version {version}")
+    header = json.loads(fin.read(header_len))
+    data_start = start + _align(_PREAMBLE.size + header_len)
+
+    path = getattr(fin, "name", None)
+    can_map = isinstance(path, str)
+    arrays = {}
+    for entry in header["arrays"]:
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        count = int(np.prod(shape))
+        if can_map and count:
+            # "c" maps copy-on-write, shared until (if ever) written to
+            arrays[entry["name"]] = np.memmap(
+                path,
+                dtype=dtype,
+                mode="r" if readonly else "c",
+                offset=data_start + entry["offset"],
+                shape=shape,
+            )
+        else:
+            fin.seek(data_start + entry["offset"])
+            arrays[entry["name"]] = np.frombuffer(
+                bytearray(fin.read(count * dtype.itemsize)), dtype=dtype
+            ).reshape(shape)
+
+    module_name, _, qualname = header["cls"].partition(":")
+    cls = getattr(importlib.import_module(module_name), qualname)
+    return cls.from_arrays(arrays, header["meta"])
+
+
+def load_index(fin: t.BinaryIO, *, readonly: bool = False) -> SignalTypeIndex[int]:
+    """Load an index in either the flat or (as a fallback) pickle format"""
+    if is_flat(fin):
+        return t.cast(SignalTypeIndex[int], read_flat(fin, readonly=readonly))
+    return t.cast(SignalTypeIndex[int], pickle.load(fin))
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _pad_to(fout: t.BinaryIO, offset: int) -> None:
+    pos = fout.tell()
+    assert pos <= offset
+    fout.write(b"\x00" * (offset - pos))
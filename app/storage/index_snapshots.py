@@ -0,0 +1,126 @@
+"""
+A local on-disk cache of the serialized indices in the database.
+
+Loading an index exports it in full from postgres, so every matcher
+restart (and every replica of a rolling deploy) transfers every index
+again. With a snapshot directory configured, each exported index is kept on
+local disk, keyed by where it's stored (its large object oid, or chunk
+generation) and updated_to_ts, which change whenever the index is rebuilt.
+A matcher whose snapshot is current loads it from disk, and skips the
+database entirely.
+
+Each snapshot has a sha256 checksum alongside it, checked before it's used,
+so a truncated or corrupt file is exported again rather than loaded. Once
+the directory grows past its size budget, the least recently used snapshots
+are removed. Removing a snapshot that is memory mapped is safe, the mapping
+keeps it alive until it's dropped.
+"""
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+import typing as t
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024
+_snapshots: t.Optional["IndexSnapshotCache"] = None
+
+
+class IndexSnapshotCache:
+    """Snapshots by key, pruned least recently used first past max_bytes"""
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(signal_type: str, source: str, updated_to_ts: int) -> str:
+        return f"{signal_type}.{source}.{updated_to_ts}"
+
+    def get(self, key: str) -> t.Optional[Path]:
+        """The snapshot for key, if we have one and it's intact"""
+        path = self._snapshot_path(key)
+        try:
+            expected = self._checksum_path(key).read_text().strip()
+        except FileNotFoundError:
+            return None
+        if not path.exists() or _sha256(path) != expected:
+            logger.warning("Index snapshot %s is corrupt, discarding", key)
+            self._remove(key)
+            return None
+        # mtime is the LRU clock
+        os.utime(path)
+        return path
+
+    def put(self, key: str, write: t.Callable[[str], None]) -> Path:
+        """
+        Store a new snapshot, written to the path passed to write().
+
+        The snapshot is only visible once it's complete, so a failed or
+        concurrent write never leaves a partial snapshot behind.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        path = self._snapshot_path(key)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            write(str(tmp))
+            checksum = _sha256(tmp)
+            tmp.rename(path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        self._checksum_path(key).write_text(checksum)
+        self.prune(keep=key)
+        return path
+
+    def prune(self, keep: t.Optional[str] = None) -> None:
+        """Remove the least recently used snapshots until we're in budget"""
+        snapshots = []
+        for path in self.path.glob("*.idx"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            snapshots.append((stat.st_mtime, stat.st_size, path.name[: -len(".idx")]))
+        total = sum(size for _, size, _ in snapshots)
+        for _, size, key in sorted(snapshots):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            logger.info("Pruning index snapshot %s (%d bytes)", key, size)
+            self._remove(key)
+            total -= size
+
+    def _snapshot_path(self, key: str) -> Path:
+        return self.path / f"{key}.idx"
+
+    def _checksum_path(self, key: str) -> Path:
+        return self.path / f"{key}.sha256"
+
+    def _remove(self, key: str) -> None:
+        self._checksum_path(key).unlink(missing_ok=True)
+        self._snapshot_path(key).unlink(missing_ok=True)
+
+
+def get_index_snapshots() -> t.Optional[IndexSnapshotCache]:
+    """The snapshot cache, or None if not configured"""
+    global _snapshots
+    if settings.index_snapshot_dir is None:
+        return None
+    if _snapshots is None:
+        _snapshots = IndexSnapshotCache(
+            settings.index_snapshot_dir, settings.index_snapshot_max_bytes
+        )
+    return _snapshots
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -16,10 +16,13 @@ static configuration and postgres.
 """
 
 import abc
+import contextlib
 from dataclasses import dataclass
 import typing as t
 import time
 
+import numpy as np
+import numpy.typing as npt
 from threatexchange.storage.interfaces import (
     ISignalTypeConfigStore,
     IContentTypeConfigStore,
@@ -61,11 +64,51 @@ class SignalTypeIndexBuildCheckpoint:
     last_item_id: int
     # What is the total hash db size (to account for removals)
     total_hash_count: int
+    # The sum of the content ids indexed. Content can commit with a
+    # timestamp before the last item's, so a count alone can't tell one
+    # such late item and one removal from no change. None if not known.
+    content_id_sum: t.Optional[int] = None
 
     @classmethod
     def get_empty(cls):
         """Represents a checkpoint for an empty index / no hashes."""
-        return cls(last_item_timestamp=-1, last_item_id=-1, total_hash_count=0)
+        return cls(
+            last_item_timestamp=-1,
+            last_item_id=-1,
+            total_hash_count=0,
+            content_id_sum=0,
+        )
+
+
+@dataclass
+class SignalTypeIndexBuildStatus:
+    """
+    The progress of index builds for a signal type, across the fleet.
+    """
+
+    # The node running a build, if one is running
+    running_build_node: t.Optional[str]
+    running_build_start_ts: t.Optional[int]
+    # How far the running (or last) build got, out of how many
+    signals_added: int
+    signals_target: int
+    last_build_complete_ts: t.Optional[int]
+    last_build_succeeded: t.Optional[bool]
+
+    @property
+    def build_in_progress(self) -> bool:
+        return self.running_build_start_ts is not None
+
+    @classmethod
+    def get_default(cls) -> t.Self:
+        return cls(
+            running_build_node=None,
+            running_build_start_ts=None,
+            signals_added=0,
+            signals_target=0,
+            last_build_complete_ts=None,
+            last_build_succeeded=None,
+        )
 
 
 class ISignalTypeIndexStore(metaclass=abc.ABCMeta):
@@ -113,6 +156,53 @@ class ISignalTypeIndexStore(metaclass=abc.ABCMeta):
         Returns chekpoint for last index build if it exists
         """
 
+    def index_updates(
+        self, timeout: float
+    ) -> t.Optional[
+        t.Iterator[t.Optional[t.Tuple[str, SignalTypeIndexBuildCheckpoint]]]
+    ]:
+        """
+        Wait for indexes to be stored, by any process.
+
+        Yields the signal type name and checkpoint of each index as it's
+        stored, and None after every timeout seconds without one, so the
+        caller gets a chance to stop. Returns None if the store can't push
+        updates, and callers should poll get_last_index_build_checkpoint().
+        """
+        return None
+
+    def index_build_lock(
+        self, signal_type: t.Type[SignalType]
+    ) -> t.ContextManager[bool]:
+        """
+        Hold the right to build this SignalType's index, if no one else does.
+
+        Enters as False (without waiting) if another builder holds it. The
+        default implementation assumes there is only ever one builder.
+        """
+        return contextlib.nullcontext(True)
+
+    def get_index_build_status(
+        self, signal_type: t.Type[SignalType]
+    ) -> SignalTypeIndexBuildStatus:
+        return SignalTypeIndexBuildStatus.get_default()
+
+    def index_build_start(
+        self, signal_type: t.Type[SignalType], node: str, signals_target: int
+    ) -> None:
+        """Record that node has started a build, to add signals_target signals"""
+        return None
+
+    def index_build_progress(
+        self, signal_type: t.Type[SignalType], signals_added: int
+    ) -> None:
+        return None
+
+    def index_build_complete(
+        self, signal_type: t.Type[SignalType], succeeded: bool
+    ) -> None:
+        return None
+
 
 @dataclass
 class SignalExchangeAPIConfig:
@@ -349,6 +439,74 @@ class BankContentIterationItem:
     bank_content_timestamp: int
 
 
+@dataclass
+class BankContentColumns:
+    """
+    A batch of signals streamed from the datastore for building an index,
+    as columns rather than an item per signal.
+    """
+
+    signal_vals: t.Sequence[str]
+    bank_content_ids: npt.NDArray[np.int64]
+    bank_content_timestamps: npt.NDArray[np.int64]
+
+    def __len__(self) -> int:
+        return len(self.bank_content_ids)
+
+    @classmethod
+    def from_items(
+        cls, items: t.Sequence[BankContentIterationItem]
+    ) -> "BankContentColumns":
+        return cls(
+            [i.signal_val for i in items],
+            np.fromiter(
+                (i.bank_content_id for i in items), dtype=np.int64, count=len(items)
+            ),
+            np.fromiter(
+                (i.bank_content_timestamp for i in items),
+                dtype=np.int64,
+                count=len(items),
+            ),
+        )
+
+
+@dataclass
+class BankContentMetadataItem:
+    """
+    What the matcher needs to know about bank content to return a match.
+    """
+
+    bank_content_id: int
+    # The store's id for the bank, as names can change
+    bank_id: int
+    disable_until_ts: int
+
+
+@dataclass
+class BankContentChangeItem:
+    """
+    A change to bank content that matchers must apply straight away.
+    """
+
+    # Position in the change log, increasing
+    id: int
+    bank_content_id: int
+    # The new disable_until_ts, or None if the content was removed
+    disable_until_ts: t.Optional[int]
+    # The transaction that made the change, for stores whose log can
+    # become visible out of id order
+    txid: int = 0
+
+    @property
+    def cursor(self) -> t.Tuple[int, int]:
+        """Pass to bank_content_get_changes() to read the changes after this"""
+        return self.txid, self.id
+
+    @property
+    def removed(self) -> bool:
+        return self.disable_until_ts is None
+
+
 class IBankStore(metaclass=abc.ABCMeta):
     """
      Interface for maintaining collections of labeled content (aka banks).
@@ -450,6 +608,98 @@ class IBankStore(metaclass=abc.ABCMeta):
         they are available for that content.
         """
 
+    def bank_yield_content_since(
+        self,
+        signal_type: t.Type[SignalType],
+        checkpoint: SignalTypeIndexBuildCheckpoint,
+        batch_size: int = 100,
+    ) -> t.Optional[t.Iterator[BankContentIterationItem]]:
+        """
+        Yield only the signals added after an index build checkpoint.
+
+        Signals are yielded in the same order as bank_yield_content(), so
+        the last one yielded is the new checkpoint.
+
+        Returns None if an incremental build isn't possible, for example
+        because signals from before the checkpoint have since been removed
+        (or committed late, behind it), in which case the index needs to be
+        built again from scratch.
+        """
+        return None
+
+    def bank_export_content(
+        self,
+        signal_type: t.Type[SignalType],
+        upto: SignalTypeIndexBuildCheckpoint,
+        batch_size: int = 10_000,
+    ) -> t.Iterator[BankContentColumns]:
+        """
+        Yield every signal of a type, up to a build target, in column batches.
+
+        For building an index from scratch in bulk. Signals are in no
+        particular order, so that stores can read them in parallel, but
+        they are exactly those up to and including upto's last item, so
+        upto, with the number of signals yielded, is the checkpoint of the
+        index built from them.
+        """
+        if upto.total_hash_count == 0:
+            return
+        batch: list[BankContentIterationItem] = []
+        for item in self.bank_yield_content(signal_type, batch_size):
+            if item.bank_content_timestamp > upto.last_item_timestamp:
+                break
+            batch.append(item)
+            if len(batch) == batch_size:
+                yield BankContentColumns.from_items(batch)
+                batch = []
+            if item.bank_content_id == upto.last_item_id:
+                break
+        if batch:
+            yield BankContentColumns.from_items(batch)
+
+    def bank_content_get_changes(
+        self, after: t.Tuple[int, int] = (0, 0), limit: int = 10_000
+    ) -> t.Sequence[BankContentChangeItem]:
+        """
+        Return changes (removals, disables) to content.
+
+        Pass the cursor of the last change seen to get only newer ones.
+        Changes are returned in cursor order, which may not be the order
+        they were made in, so apply a batch of them in order of id. Stores
+        that don't track changes return nothing, and removals and disables
+        only take effect when the index is next built.
+        """
+        return []
+
+    def bank_content_get_changes_start(self) -> t.Tuple[int, int]:
+        """
+        The cursor to read changes from, to see every change that content
+        read from now on might not reflect.
+        """
+        return 0, 0
+
+    def get_banks_by_id(self) -> t.Mapping[int, BankConfig]:
+        """
+        Return all bank configs, by the id bank_content_get_metadata() uses.
+        """
+        return {}
+
+    def bank_content_get_metadata(
+        self, after_id: int = 0, limit: int = 10_000
+    ) -> t.Sequence[BankContentMetadataItem]:
+        """
+        Return the metadata of content, in order of id.
+
+        Pass the last id seen to get only content added since. Stores that
+        can't list content cheaply return nothing, in which case matches are
+        looked up with bank_content_get() instead.
+        """
+        return []
+
+    def bank_content_prune_changes(self, before_ts: int) -> None:
+        """Forget changes made before a time, once no matcher needs them"""
+        return None
+
 
 class IUnifiedStore(
     IContentTypeConfigStore,
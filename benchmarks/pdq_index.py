@@ -0,0 +1,97 @@
+"""
+Compare PDQ query latency between the brute force and MIH indexes.
+
+Random hashes are a best case for MIH (substrings are spread evenly over
+the buckets), so half of the queries are near-duplicates of a banked hash,
+and half are unrelated, like most traffic.
+
+  python -m benchmarks.pdq_index --sizes 100000 1000000 10000000
+"""
+
+import argparse
+import statistics
+import time
+import typing as t
+
+import numpy as np
+
+from app.matching.mih_index import MIHPdqIndex
+from app.matching.pdq_index import WORDS_IN_PDQ, PackedPdqIndex
+
+
+def random_index(cls: t.Type[PackedPdqIndex], hashes: np.ndarray) -> PackedPdqIndex:
+    index = cls()
+    index.hashes = hashes
+    index.ids = np.arange(hashes.shape[1], dtype=np.int64)
+    return index
+
+
+def make_queries(
+    rng: np.random.Generator, hashes: np.ndarray, count: int
+) -> list[np.ndarray]:
+    queries = []
+    for i in range(count):
+        if i % 2:
+            queries.append(rng.integers(0, 2**64, size=WORDS_IN_PDQ, dtype=np.uint64))
+            continue
+        query = hashes[:, rng.integers(hashes.shape[1])].copy()
+        for bit in rng.choice(256, rng.integers(0, 32), replace=False):
+            query[bit // 64] ^= np.uint64(1) << np.uint64(bit % 64)
+        queries.append(query)
+    return queries
+
+
+def time_queries(
+    index: PackedPdqIndex, queries: list[np.ndarray]
+) -> tuple[list[float], list[int]]:
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        ids, _ = index.query_arrays(query)
+        latencies.append(time.perf_counter() - start)
+        found.append(len(ids))
+    return latencies, found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(
+        f"{'hashes':>10} {'index':>7} {'build':>8} {'p50':>9} {'p99':>9} {'candidates':>11}"
+    )
+    for size in args.sizes:
+        hashes = rng.integers(0, 2**64, size=(WORDS_IN_PDQ, size), dtype=np.uint64)
+        queries = make_queries(rng, hashes, args.queries)
+        results = {}
+        for name, cls in (("packed", PackedPdqIndex), ("mih", MIHPdqIndex)):
+            index = random_index(cls, hashes)
+            start = time.perf_counter()
+            candidates = "-"
+            if isinstance(index, MIHPdqIndex):
+                index.candidates(queries[0])  # builds the tables
+                candidates = str(
+                    int(statistics.mean(len(index.candidates(q)) for q in queries[:20]))
+                )
+            build = time.perf_counter() - start
+
+            latencies, results[name] = time_queries(index, queries)
+            latencies.sort()
+            print(
+                f"{size:>10} {name:>7} {build:>7.2f}s"
+                f" {latencies[len(latencies) // 2] * 1000:>7.2f}ms"
+                f" {latencies[int(len(latencies) * 0.99)] * 1000:>7.2f}ms"
+                f" {candidates:>11}"
+            )
+        assert results["packed"] == results["mih"], "MIH results differ!"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+# The engine is created from settings at import, so point it at the test
+# database (if there is one) before anything imports the app
+if "OMM_TEST_DATABASE_URL" in os.environ:
+    os.environ["OMM_DATABASE_URL"] = os.environ["OMM_TEST_DATABASE_URL"]
+else:
+    os.environ.setdefault(
+        "OMM_DATABASE_URL", "postgresql+psycopg2://localhost/omm_test"
+    )
+
+
+@pytest.fixture
+def database():
+    """
+    An empty database with OMM's schema, recreated for each test.
+
+    Set OMM_TEST_DATABASE_URL to a scratch postgres database to run these
+    tests. Everything in it is dropped.
+    """
+    if "OMM_TEST_DATABASE_URL" not in os.environ:
+        pytest.skip("OMM_TEST_DATABASE_URL is not set")
+
+    # Registers every model
+    import app.storage.database.interface  # noqa: F401
+    from app.storage.database import schema
+    from app.storage.database.base_model import BaseModel
+    from app.storage.database.connection import create_session, engine
+
+    create_session().remove()
+    BaseModel.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE IF EXISTS omm_schema_migration")
+    # create_all() stands in for the HMA schema, which the migrations extend
+    BaseModel.metadata.create_all(engine)
+    schema.migrate()
+    yield engine
+    create_session().remove()
@@ -0,0 +1,129 @@
+import struct
+import typing as t
+
+import pytest
+from sqlalchemy import text
+
+from app.storage.database import bulk_copy
+
+TYPES: t.Sequence[bulk_copy.ColumnType] = ("bigint", "text", "bytea")
+ROWS = [
+    (1, "a", b"x"),
+    (-(2**63), "", b""),
+    (2**63 - 1, "naïve ☃", b"\x00\xff\x00"),
+    (None, None, None),
+    (42, None, b"\r\n"),
+]
+
+
+def read_all(reader: t.Any, size: int) -> bytes:
+    data = b""
+    while chunk := reader.read(size):
+        data += chunk
+    return data
+
+
+def decode(data: bytes, types: t.Sequence[str]) -> list[tuple[t.Any, ...]]:
+    """Parse COPY's binary format, checking its framing as we go"""
+    assert data[:11] == b"PGCOPY\n\xff\r\n\x00"
+    assert struct.unpack_from("!ii", data, 11) == (0, 0)
+    pos = 19
+    rows = []
+    while True:
+        (fields,) = struct.unpack_from("!h", data, pos)
+        pos += 2
+        if fields == -1:
+            break
+        assert fields == len(types)
+        row: list[t.Any] = []
+        for type in types:
+            (length,) = struct.unpack_from("!i", data, pos)
+            pos += 4
+            if length == -1:
+                row.append(None)
+                continue
+            raw = data[pos : pos + length]
+            pos += length
+            if type == "bigint":
+                assert length == 8
+                row.append(struct.unpack("!q", raw)[0])
+            elif type == "text":
+                row.append(raw.decode())
+            else:
+                row.append(raw)
+        rows.append(tuple(row))
+    # Nothing after the trailer
+    assert pos == len(data)
+    return rows
+
+
+def test_round_trip():
+    data = read_all(bulk_copy._RowReader(ROWS, TYPES), 8192)
+    assert decode(data, TYPES) == ROWS
+
+
+def test_no_rows():
+    data = read_all(bulk_copy._RowReader([], TYPES), 8192)
+    assert data == bulk_copy._HEADER + bulk_copy._TRAILER
+    assert decode(data, TYPES) == []
+
+
+@pytest.mark.parametrize("read_size", [1, 7, 64, 8192])
+def test_buffer_boundaries(monkeypatch, read_size):
+    # Small enough that rows are encoded over many fills, and rows and
+    # reads straddle the boundaries between them
+    monkeypatch.setattr(bulk_copy, "_BUFFER_SIZE", 50)
+    rows = [(i, f"hash{i}", bytes([i % 256]) * (i % 13)) for i in range(500)]
+    reader = bulk_copy._RowReader(rows, TYPES)
+    data = read_all(reader, read_size)
+    assert decode(data, TYPES) == rows
+    # And it stays at EOF
+    assert reader.read(10) == b""
+
+
+def test_rows_are_encoded_lazily(monkeypatch):
+    monkeypatch.setattr(bulk_copy, "_BUFFER_SIZE", 50)
+    consumed = 0
+
+    def rows():
+        nonlocal consumed
+        for i in range(1000):
+            consumed += 1
+            yield (i, "x", b"y")
+
+    reader = bulk_copy._RowReader(rows(), TYPES)
+    assert reader.read(len(bulk_copy._HEADER)) == bulk_copy._HEADER
+    assert consumed == 0
+    reader.read(10)
+    assert 0 < consumed < 1000
+
+
+def test_wrong_number_of_columns():
+    with pytest.raises(ValueError):
+        read_all(bulk_copy._RowReader([(1, "a")], TYPES), 8192)
+
+
+def test_copy_rows_statement():
+    class Cursor:
+        def copy_expert(self, sql, file, size):
+            self.sql = sql
+            self.data = read_all(file, size)
+
+    cursor = Cursor()
+    bulk_copy.copy_rows(
+        cursor, "t", [("a", "bigint"), ("b", "text"), ("c", "bytea")], ROWS
+    )
+    assert cursor.sql == "COPY t (a, b, c) FROM STDIN WITH (FORMAT binary)"
+    assert decode(cursor.data, TYPES) == ROWS
+
+
+def test_copy_rows_into_postgres(database):
+    with database.begin() as conn:
+        conn.exec_driver_sql("CREATE TEMP TABLE t (a bigint, b text, c bytea)")
+        cursor = conn.connection.cursor()
+        bulk_copy.copy_rows(
+            cursor, "t", [("a", "bigint"), ("b", "text"), ("c", "bytea")], ROWS
+        )
+        got = conn.execute(text("SELECT a, b, c FROM t")).all()
+    got = [(a, b, None if c is None else bytes(c)) for a, b, c in got]
+    assert sorted(got, key=repr) == sorted(ROWS, key=repr)
@@ -0,0 +1,113 @@
+import typing as t
+from dataclasses import dataclass
+
+from app.matching.content_metadata import ContentMetadata
+from app.storage import interface
+
+
+@dataclass
+class Match:
+    metadata: int
+
+
+class FakeStore:
+    """The few IBankStore reads ContentMetadata makes"""
+
+    def __init__(self) -> None:
+        self.banks: dict[int, interface.BankConfig] = {}
+        self.content: list[interface.BankContentMetadataItem] = []
+        self.reads: list[str] = []
+
+    def get_banks_by_id(self) -> t.Mapping[int, interface.BankConfig]:
+        self.reads.append("banks")
+        return dict(self.banks)
+
+    def bank_content_get_metadata(
+        self, after_id: int, limit: int
+    ) -> t.Sequence[interface.BankContentMetadataItem]:
+        self.reads.append("content")
+        items = [i for i in self.content if i.bank_content_id > after_id]
+        return items[:limit]
+
+    def bank_content_get_changes_start(self) -> t.Tuple[int, int]:
+        return (0, 0)
+
+    def bank_content_get_changes(
+        self, after: t.Tuple[int, int], limit: int
+    ) -> t.Sequence[interface.BankContentChangeItem]:
+        return []
+
+    def bank_content_get(
+        self, ids: t.Iterable[int]
+    ) -> t.Sequence[interface.BankContentConfig]:
+        return []
+
+    def add_bank(self, id: int, name: str) -> None:
+        self.banks[id] = interface.BankConfig(name, 1.0)
+
+    def add_content(self, id: int, bank_id: int) -> None:
+        self.content.append(
+            interface.BankContentMetadataItem(
+                id, bank_id, interface.BankContentConfig.ENABLED
+            )
+        )
+
+
+def test_bank_created_during_refresh():
+    store = FakeStore()
+    store.add_bank(1, "OLD")
+    store.add_content(1, 1)
+
+    # A bank, and content in it, created between the reads of a refresh
+    read_content = store.bank_content_get_metadata
+
+    def racing_read(after_id: int, limit: int) -> t.Any:
+        if 2 not in store.banks:
+            store.add_bank(2, "NEW")
+            store.add_content(2, 2)
+        return read_content(after_id, limit)
+
+    store.bank_content_get_metadata = racing_read  # type: ignore[method-assign]
+
+    metadata = ContentMetadata()
+    metadata.refresh(store)  # type: ignore[arg-type]
+
+    assert store.reads.index("banks") > store.reads.index("content")
+    resolved = metadata.resolve([Match(1), Match(2)], store)  # type: ignore[arg-type]
+    assert [(m.metadata, bank) for m, bank in resolved] == [(1, "OLD"), (2, "NEW")]
+
+
+def test_resolve_content_in_a_bank_not_yet_in_the_table():
+    store = FakeStore()
+    store.add_bank(1, "OLD")
+    store.add_content(1, 1)
+    metadata = ContentMetadata()
+    metadata.refresh(store)  # type: ignore[arg-type]
+
+    # As a refresh in progress leaves it, content added but no bank table
+    metadata._add(
+        [interface.BankContentMetadataItem(2, 2, interface.BankContentConfig.ENABLED)]
+    )
+
+    resolved = metadata.resolve([Match(1), Match(2)], store)  # type: ignore[arg-type]
+    # Looked up in the store instead, which has no such content
+    assert [(m.metadata, bank) for m, bank in resolved] == [(1, "OLD")]
+
+
+def test_reset_replaces_all_columns_at_once():
+    store = FakeStore()
+    store.add_bank(1, "BANK")
+    for id in range(1, 100):
+        store.add_content(id, 1)
+    metadata = ContentMetadata(change_retention=0)
+    metadata.refresh(store)  # type: ignore[arg-type]
+    before = metadata._columns
+
+    metadata.refresh(store)  # type: ignore[arg-type]
+
+    # Reloaded into new columns, leaving the old ones whole for any reader
+    # still using them
+    assert metadata._columns is not before
+    assert len(before.bank) == len(before.disable_until_ts)
+    assert len(metadata._columns.bank) == len(metadata._columns.disable_until_ts)
+    assert len(metadata) == 99
@@ -0,0 +1,99 @@
+import random
+import typing as t
+
+import pytest
+from sqlalchemy import text
+from threatexchange.exchanges.collab_config import CollaborationConfigBase
+from threatexchange.exchanges.fetch_state import (
+    FetchedSignalMetadata,
+    NoCheckpointing,
+)
+from threatexchange.signal_type.md5 import VideoMD5Signal
+from threatexchange.signal_type.pdq.signal import PdqSignal
+
+from app.settings import settings
+
+
+def fetched(seed: int, n: int) -> dict[t.Any, t.Optional[FetchedSignalMetadata]]:
+    rand = random.Random(seed)
+    dat: dict[t.Any, t.Optional[FetchedSignalMetadata]] = {}
+    for _ in range(n):
+        dat[(PdqSignal.get_name(), rand.randbytes(32).hex())] = FetchedSignalMetadata()
+        dat[(VideoMD5Signal.get_name(), rand.randbytes(16).hex())] = (
+            FetchedSignalMetadata()
+        )
+    # Records we can't use are treated as deletes
+    dat[("not_a_signal_type", "x")] = FetchedSignalMetadata()
+    dat[(PdqSignal.get_name(), rand.randbytes(32).hex())] = None
+    return dat
+
+
+def imported_rows(engine: t.Any, collab_name: str) -> t.Any:
+    """Everything a fetch wrote for a collab, without ids"""
+    with engine.connect() as conn:
+        return sorted(
+            conn.execute(
+                text("""
+                    SELECT
+                        xd.fetch_id,
+                        xd.pickled_fetch_signal_metadata,
+                        xd.fetched_metadata_summary::text,
+                        xd.matched,
+                        xd.verification_result,
+                        b.import_from_exchange_id = e.id,
+                        bc.disable_until_ts,
+                        bc.original_content_uri,
+                        cs.signal_type,
+                        cs.signal_val
+                    FROM exchange e
+                    JOIN exchange_data xd ON xd.collab_id = e.id
+                    LEFT JOIN bank_content bc ON bc.imported_from_id = xd.id
+                    LEFT JOIN bank b ON b.id = bc.bank_id
+                    LEFT JOIN content_signal cs ON cs.content_id = bc.id
+                    WHERE e.name = :name
+                    """),
+                {"name": collab_name},
+            ).all(),
+            key=repr,
+        )
+
+
+@pytest.fixture
+def store(database):
+    from app.storage.database.interface import DefaultOMMStore
+
+    return DefaultOMMStore()
+
+
+def commit(store: t.Any, name: str, dat: t.Any, copy: bool, monkeypatch: t.Any) -> None:
+    monkeypatch.setattr(settings, "exchange_copy_min_records", 1 if copy else 10**9)
+    collab = store.exchanges_get()[name]
+    store.exchange_commit_fetch(
+        collab, store.exchange_get_fetch_checkpoint(name), dat, NoCheckpointing()
+    )
+
+
+def test_copy_and_insert_create_the_same_rows(store, database, monkeypatch):
+    for name in ("INSERTED", "COPIED"):
+        store.exchange_update(
+            CollaborationConfigBase(name=name, api="sample", enabled=True),
+            create=True,
+        )
+
+    first = fetched(1, 200)
+    # Some unchanged, some deleted, and some new
+    second = {k: v for i, (k, v) in enumerate(first.items()) if i % 3}
+    second.update({k: None for i, k in enumerate(first) if i % 3 == 0})
+    second.update(fetched(2, 50))
+
+    for dat in (first, second):
+        commit(store, "INSERTED", dat, False, monkeypatch)
+        commit(store, "COPIED", dat, True, monkeypatch)
+        inserted = imported_rows(database, "INSERTED")
+        assert inserted
+        assert imported_rows(database, "COPIED") == inserted
+
+    # Every usable record has its content and signal
+    fetch_ids = {row[0] for row in inserted}
+    assert len(fetch_ids) == len(inserted)
+    assert all(row[5] and row[8] is not None for row in inserted)
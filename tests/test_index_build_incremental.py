@@ -0,0 +1,78 @@
+import random
+
+import pytest
+from sqlalchemy import text
+from threatexchange.signal_type.pdq.signal import PdqSignal
+
+from app.matching.index_builder import build_index
+from app.storage import interface
+
+
+@pytest.fixture
+def store(database):
+    from app.storage.database.interface import DefaultOMMStore
+
+    store = DefaultOMMStore()
+    store.bank_update(interface.BankConfig("BANK", 1.0), create=True)
+    return store
+
+
+# Each content id's signal, to query the index for it
+signal_vals: dict[int, str] = {}
+
+
+def add_content(store, rand: random.Random) -> int:
+    val = rand.randbytes(32).hex()
+    id = store.bank_add_content("BANK", {PdqSignal: val})
+    signal_vals[id] = val
+    return id
+
+
+def is_indexed(store, id: int) -> bool:
+    index = store.get_signal_type_index(PdqSignal)
+    return any(match.metadata == id for match in index.query(signal_vals[id]))
+
+
+def test_incremental_build_appends_new_content(store):
+    rand = random.Random(1)
+    ids = [add_content(store, rand) for _ in range(3)]
+    build_index(store, PdqSignal)
+
+    ids.append(add_content(store, rand))
+    checkpoint = store.get_last_index_build_checkpoint(PdqSignal)
+    added = store.bank_yield_content_since(PdqSignal, checkpoint)
+    assert added is not None
+    assert [item.bank_content_id for item in added] == ids[-1:]
+
+    build_index(store, PdqSignal)
+    assert store.get_last_index_build_checkpoint(
+        PdqSignal
+    ) == store.get_current_index_build_target(PdqSignal)
+
+
+def test_late_content_and_a_removal_rebuild(store, database):
+    rand = random.Random(2)
+    ids = [add_content(store, rand) for _ in range(3)]
+    build_index(store, PdqSignal)
+    checkpoint = store.get_last_index_build_checkpoint(PdqSignal)
+
+    # Content whose transaction began before the build, but committed after,
+    # and a removal, which leave the count before the checkpoint the same
+    late = add_content(store, rand)
+    with database.begin() as conn:
+        conn.execute(
+            text(
+                "UPDATE content_signal SET create_time = "
+                "(SELECT min(create_time) FROM content_signal) WHERE content_id = :id"
+            ),
+            {"id": late},
+        )
+    store.bank_remove_content("BANK", ids[0])
+
+    assert store.get_current_index_build_target(PdqSignal) != checkpoint
+    assert store.bank_yield_content_since(PdqSignal, checkpoint) is None
+
+    build_index(store, PdqSignal)
+    assert is_indexed(store, late)
+    assert not is_indexed(store, ids[0])
+    assert all(is_indexed(store, id) for id in ids[1:])
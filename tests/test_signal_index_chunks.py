@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import select
+from threatexchange.signal_type.md5 import VideoMD5Signal
+
+from app.settings import settings
+from app.storage import interface
+
+
+@pytest.fixture
+def store(database, monkeypatch):
+    from app.storage.database.interface import DefaultOMMStore
+
+    monkeypatch.setattr(settings, "index_storage", "chunked")
+    # Small enough that each index has a few chunks
+    monkeypatch.setattr(settings, "index_chunk_size", 256)
+    return DefaultOMMStore()
+
+
+def store_index(store, n: int) -> None:
+    index = VideoMD5Signal.get_index_cls().build(
+        (f"{i:032x}", i) for i in range(1, n + 1)
+    )
+    store.store_signal_type_index(
+        VideoMD5Signal,
+        index,
+        interface.SignalTypeIndexBuildCheckpoint(n, n, n, n * (n + 1) // 2),
+    )
+
+
+def manifest() -> tuple[int, int, int, int, int]:
+    from app.storage.database.connection import create_session
+    from app.storage.database.models.signal_index import SignalIndex
+
+    session = create_session()
+    session.expire_all()
+    record = session.execute(select(SignalIndex)).scalar_one()
+    return (
+        record.id,
+        record.chunk_generation,
+        record.chunk_count,
+        record.chunk_size,
+        record.raw_size,
+    )
+
+
+def test_previous_generation_is_kept_for_readers(store):
+    from app.storage.database.connection import create_session
+    from app.storage.database.models.signal_index_chunk import (
+        SignalIndexChunk,
+        read_chunks,
+    )
+
+    store_index(store, 50)
+    # A matcher reads the manifest, then a build swaps in a new generation
+    # before it has read the chunks
+    old = manifest()
+    assert old[1] == 1 and old[2] > 1
+    store_index(store, 60)
+    assert manifest()[1] == 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        read_chunks(*old, os.path.join(tmp, "index"))
+
+    # Only the generation before the current one is kept
+    store_index(store, 70)
+    generations = set(
+        create_session().execute(select(SignalIndexChunk.generation)).scalars()
+    )
+    assert generations == {2, 3}
+    assert store.get_signal_type_index(VideoMD5Signal) is not None